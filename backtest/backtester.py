@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
+from collections import namedtuple
 from tqdm import tqdm
 import logging
+import itertools
 from numba import njit, prange
 
 from config import StrategyConfig
@@ -15,82 +17,501 @@ from analyzers.exporters import ResultsExporter
 
 logger = logging.getLogger(__name__)
 
+# Параметры стратегии в виде, понятном numba
+KernelParams = namedtuple("KernelParams", [
+    "pump_window",
+    "pump_threshold",
+    "stall_bars",
+    "watchlist_timeout",
+    "tp_percent",
+    "sl_multiplier",
+    "slippage",
+    "taker_fee",
+    "trade_size_usdt",
+])
+
+# Причины выхода (коды в буфере сделок)
+EXIT_SL = 0
+EXIT_TP = 1
+EXIT_EOD = 2
+EXIT_REASONS = ("sl", "tp", "eod")
+
+# Строки буфера сделок (SoA: одна строка = одно поле всех сделок)
+T_ENTRY_IDX = 0
+T_EXIT_IDX = 1
+T_ENTRY_PRICE = 2
+T_EXIT_PRICE = 3
+T_TP_PRICE = 4
+T_SL_PRICE = 5
+T_LOCAL_HIGH = 6
+T_PUMP_START_IDX = 7
+T_PUMP_END_IDX = 8
+T_PUMP_PERCENT = 9
+T_POSITION_SIZE = 10
+T_EXIT_REASON = 11
+T_PNL_USDT = 12
+T_PNL_PERCENT = 13
+T_MFE = 14
+T_MAE = 15
+TRADE_FIELDS = 16
+
+# Строки буфера снимков equity
+S_IDX = 0
+S_CASH = 1
+S_OPEN_COUNT = 2
+S_DRAWDOWN = 3
+SNAPSHOT_FIELDS = 4
+SNAPSHOT_EVERY = 4
+
+
+def make_kernel_params(config: StrategyConfig) -> KernelParams:
+    """Упаковка StrategyConfig в KernelParams"""
+    return KernelParams(
+        pump_window=int(config.pump_window),
+        pump_threshold=float(config.pump_threshold),
+        stall_bars=int(config.stall_bars),
+        watchlist_timeout=int(config.watchlist_timeout),
+        tp_percent=float(config.tp_percent),
+        sl_multiplier=float(config.sl_multiplier),
+        slippage=float(config.slippage),
+        taker_fee=float(config.taker_fee),
+        trade_size_usdt=float(config.trade_size_usdt),
+    )
+
+
+@njit(cache=True, nogil=True)
+def compute_rolling_max(high: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Скользящий максимум high по окну [idx - window, idx] за один проход (монотонная очередь).
+    rargmax хранит индекс первого максимума в окне - как в detect_pump_numba.
+    """
+    n = len(high)
+    rmax = np.empty(n, dtype=np.float64)
+    rargmax = np.empty(n, dtype=np.int64)
+    dq = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+
+    for i in range(n):
+        # строго меньше: при равенстве остаётся более ранний индекс
+        while tail > head and high[dq[tail - 1]] < high[i]:
+            tail -= 1
+        dq[tail] = i
+        tail += 1
+
+        if dq[head] < i - window:
+            head += 1
+
+        rmax[i] = high[dq[head]]
+        rargmax[i] = dq[head]
+
+    return rmax, rargmax
+
+
+@njit(cache=True, nogil=True)
+def _position_multiplier(trades: int, profitable: int, max_loss: float) -> float:
+    """То же, что RiskManager.get_position_multiplier, но на счётчиках"""
+    if trades < 3:
+        return 0.5
+    if max_loss < -200:
+        return 0.25
+    if profitable / trades < 0.7:
+        return 0.5
+    return 1.0
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _run_symbol_kernel(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    params: KernelParams,
+    capital: float,
+    peak_capital: float,
+    gate_capital: bool,
+    out_trades: np.ndarray,
+    out_snapshots: np.ndarray,
+) -> Tuple[int, int, float, float]:
+    """
+    Весь бар-цикл одного символа: памп -> watchlist -> вход -> TP/SL -> снимки equity -> EOD.
+    Повторяет StrategyEngine + PositionManager + Portfolio, но на скалярах:
+    на символ максимум один элемент watchlist и одна позиция.
+    gate_capital=False отключает проверку Portfolio.can_open_position.
+
+    Возвращает (кол-во сделок, кол-во снимков, капитал, пик капитала).
+    """
+    n = len(high)
+    pump_window = params.pump_window
+    rmax, rargmax = compute_rolling_max(high, pump_window)
+
+    # watchlist
+    wl_active = False
+    wl_local_high = 0.0
+    wl_pump_start = 0
+    wl_pump_end = 0
+    wl_pump_percent = 0.0
+    wl_added = 0
+    wl_stall = 0
+
+    # открытая позиция - пишется прямо в слот out_trades[:, n_trades]
+    pos_open = False
+    entry_idx = 0
+    entry_price = 0.0
+    tp_price = 0.0
+    sl_price = 0.0
+    position_size = 0.0
+    min_low = 0.0  # экстремумы с момента входа - для MFE/MAE без повторного прохода
+    max_high = 0.0
+
+    # статистика монеты для риск-множителя
+    st_trades = 0
+    st_profitable = 0
+    st_max_loss = 0.0
+
+    n_trades = 0
+    n_snaps = 0
+    slippage_total = params.slippage + params.slippage
+
+    for idx in range(pump_window, n + 1):
+        exit_reason = -1
+        exit_price = 0.0
+
+        if idx < n:
+            # 1) поиск пампа
+            start_price = close[idx - pump_window]
+            if start_price != 0:
+                pump_percent = (rmax[idx] - start_price) / start_price
+                if pump_percent >= params.pump_threshold:
+                    wl_active = True
+                    wl_local_high = rmax[idx]
+                    wl_pump_start = idx - pump_window
+                    wl_pump_end = idx
+                    wl_pump_percent = pump_percent * 100
+                    wl_added = idx
+                    wl_stall = 0
+
+            # 2) watchlist: таймаут, обновление high, stall
+            ready = False
+            if wl_active:
+                if idx - wl_added >= params.watchlist_timeout:
+                    wl_active = False
+                else:
+                    if high[idx] > wl_local_high:
+                        wl_local_high = high[idx]
+                        wl_stall = 0
+                    else:
+                        wl_stall += 1
+                    ready = wl_stall >= params.stall_bars
+
+            # 3) вход
+            if ready and not pos_open and (not gate_capital or capital >= params.trade_size_usdt):
+                tp = wl_local_high * (1 - params.tp_percent)
+                if close[idx] > tp:
+                    wl_active = False
+                    entry = close[idx] * (1 + params.slippage)
+                    sl = entry * params.sl_multiplier
+                    if high[idx] >= sl or low[idx] <= tp:
+                        # TP/SL на свече входа: сделка не открывается,
+                        # риск-менеджер получает нулевой результат
+                        st_trades += 1
+                        st_max_loss = min(st_max_loss, 0.0)
+                    else:
+                        pos_open = True
+                        entry_idx = idx
+                        entry_price = entry
+                        tp_price = tp
+                        sl_price = sl
+                        min_low = low[idx]
+                        max_high = high[idx]
+                        position_size = params.trade_size_usdt * _position_multiplier(
+                            st_trades, st_profitable, st_max_loss
+                        )
+                        out_trades[T_ENTRY_IDX, n_trades] = idx
+                        out_trades[T_ENTRY_PRICE, n_trades] = entry
+                        out_trades[T_TP_PRICE, n_trades] = tp
+                        out_trades[T_SL_PRICE, n_trades] = sl
+                        out_trades[T_LOCAL_HIGH, n_trades] = wl_local_high
+                        out_trades[T_PUMP_START_IDX, n_trades] = wl_pump_start
+                        out_trades[T_PUMP_END_IDX, n_trades] = wl_pump_end
+                        out_trades[T_PUMP_PERCENT, n_trades] = wl_pump_percent
+                        out_trades[T_POSITION_SIZE, n_trades] = position_size
+
+            # 4) TP/SL
+            if pos_open:
+                if low[idx] < min_low:
+                    min_low = low[idx]
+                if high[idx] > max_high:
+                    max_high = high[idx]
+                if high[idx] >= sl_price:
+                    exit_reason = EXIT_SL
+                    exit_price = sl_price * (1 + params.slippage)
+                elif low[idx] <= tp_price:
+                    exit_reason = EXIT_TP
+                    exit_price = tp_price * (1 + params.slippage)
+            exit_idx = idx
+        else:
+            # EOD: закрываем остаток по последней свече
+            exit_idx = n - 1
+            if pos_open:
+                exit_reason = EXIT_EOD
+                exit_price = close[exit_idx] * (1 + params.slippage)
+
+        # 5) закрытие, риск-статистика и капитал
+        if exit_reason >= 0:
+            fees_total = 2 * position_size * params.taker_fee
+            pnl = (entry_price - exit_price) / entry_price * position_size
+            pnl -= fees_total
+            pnl -= slippage_total
+            pnl_percent = pnl / position_size * 100.0
+
+            out_trades[T_EXIT_IDX, n_trades] = exit_idx
+            out_trades[T_EXIT_PRICE, n_trades] = exit_price
+            out_trades[T_EXIT_REASON, n_trades] = exit_reason
+            out_trades[T_PNL_USDT, n_trades] = pnl
+            out_trades[T_PNL_PERCENT, n_trades] = pnl_percent
+            out_trades[T_MFE, n_trades] = (min_low - entry_price) * 100 / entry_price
+            out_trades[T_MAE, n_trades] = (max_high - entry_price) * 100 / entry_price
+            n_trades += 1
+            pos_open = False
+
+            st_trades += 1
+            if pnl_percent > 0:
+                st_profitable += 1
+            else:
+                st_max_loss = min(st_max_loss, pnl_percent)
+
+            capital += pnl
+            peak_capital = max(peak_capital, capital)
+
+        # 6) снимок equity (открытые позиции без текущей цены идут по 0)
+        if idx < n and idx % SNAPSHOT_EVERY == 0:
+            out_snapshots[S_IDX, n_snaps] = idx
+            out_snapshots[S_CASH, n_snaps] = capital
+            out_snapshots[S_OPEN_COUNT, n_snaps] = 1 if pos_open else 0
+            out_snapshots[S_DRAWDOWN, n_snaps] = (
+                (peak_capital - capital) / peak_capital * 100 if peak_capital > 0 else 0.0
+            )
+            n_snaps += 1
+            peak_capital = max(peak_capital, capital)
+
+    return n_trades, n_snaps, capital, peak_capital
+
+
+@njit(cache=True, parallel=True)
+def _run_all_symbols(
+    all_high: np.ndarray,
+    all_low: np.ndarray,
+    all_close: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    params: KernelParams,
+    out_trades: np.ndarray,
+    out_counts: np.ndarray,
+):
+    """
+    Все символы в одном процессе: данные склеены в плоские массивы,
+    символ s занимает [starts[s], ends[s]). Сделки символа пишутся в тот же диапазон out_trades.
+    Капитал не проверяем: общего портфеля в параллельном режиме нет, символы независимы.
+    """
+    for s in prange(len(starts)):
+        a = starts[s]
+        b = ends[s]
+        snapshots = np.empty((SNAPSHOT_FIELDS, (b - a) // SNAPSHOT_EVERY + 1), dtype=np.float64)
+        n_trades, _, _, _ = _run_symbol_kernel(
+            all_high[a:b],
+            all_low[a:b],
+            all_close[a:b],
+            params,
+            0.0,
+            0.0,
+            False,
+            out_trades[:, a:b],
+            snapshots,
+        )
+        out_counts[s] = n_trades
+
+
+# Тело ядра символа для подстановки в специализированные ядра
+_run_symbol_kernel_inline = njit(inline='always', fastmath=True, nogil=True)(_run_symbol_kernel.py_func)
+_specialized_kernels: Dict[KernelParams, Tuple] = {}
+
+
+def specialize_kernels(params: KernelParams) -> Tuple:
+    """
+    Пара (_run_symbol_kernel, _run_all_symbols) с параметрами стратегии, вшитыми константами:
+    numba замораживает переменные замыкания, и LLVM сворачивает pump_window, stall_bars, tp_percent...
+    Сигнатуры те же, аргумент params игнорируется.
+    Компиляция ~1с на набор параметров и без дискового кэша - окупается на длинных прогонах
+    """
+    kernels = _specialized_kernels.get(params)
+    if kernels is not None:
+        return kernels
+
+    @njit(fastmath=True, nogil=True)
+    def symbol_kernel(high, low, close, _params, capital, peak_capital, gate_capital, out_trades, out_snapshots):
+        return _run_symbol_kernel_inline(
+            high, low, close, params, capital, peak_capital, gate_capital, out_trades, out_snapshots
+        )
+
+    @njit(parallel=True)
+    def all_symbols_kernel(all_high, all_low, all_close, starts, ends, _params, out_trades, out_counts):
+        for s in prange(len(starts)):
+            a = starts[s]
+            b = ends[s]
+            snapshots = np.empty((SNAPSHOT_FIELDS, (b - a) // SNAPSHOT_EVERY + 1), dtype=np.float64)
+            n_trades, _, _, _ = _run_symbol_kernel_inline(
+                all_high[a:b],
+                all_low[a:b],
+                all_close[a:b],
+                params,
+                0.0,
+                0.0,
+                False,
+                out_trades[:, a:b],
+                snapshots,
+            )
+            out_counts[s] = n_trades
+
+    kernels = (symbol_kernel, all_symbols_kernel)
+    _specialized_kernels[params] = kernels
+    return kernels
+
+
+def _warmup_numba():
+    """
+    Прогрев ядер на крошечных данных: компиляция (или загрузка из кэша numba)
+    происходит до запуска бэктеста и не попадает в его время.
+    """
+    n = 100
+    close = np.linspace(1.0, 2.0, n)
+    params = make_kernel_params(StrategyConfig())
+    compute_rolling_max(close, params.pump_window)
+    _run_all_symbols(
+        close, close, close,
+        np.zeros(1, dtype=np.int64),
+        np.full(1, n, dtype=np.int64),
+        params,
+        np.empty((TRADE_FIELDS, n), dtype=np.float64),
+        np.zeros(1, dtype=np.int64),
+    )
+    snapshots = np.empty((SNAPSHOT_FIELDS, n // SNAPSHOT_EVERY + 1), dtype=np.float64)
+    _run_symbol_kernel(
+        close, close, close, params, 1000.0, 1000.0, True,
+        np.empty((TRADE_FIELDS, n), dtype=np.float64), snapshots,
+    )
+
 
 class Backtester:
     """Основной класс бэктестера"""
 
-    def __init__(self, config: StrategyConfig):
+    def __init__(self, config: StrategyConfig, specialize: bool = False):
         self.config = config
+        self.specialize = specialize  # ядра со вшитыми параметрами (specialize_kernels)
         self.strategy = StrategyEngine(config)
         self.position_manager = PositionManager(config)
         self.portfolio = Portfolio(config)
         self.results_exporter = ResultsExporter(config)
         self.all_trades: List[Trade] = []
+        self._trade_seq = itertools.count()  # номер сделки для trade_id
 
     def run_on_symbol(self, symbol: str, df: pd.DataFrame) -> List[Trade]:
         """Запуск бэктеста на одном символе"""
-        symbol_trades: List[Trade] = []
-
-        high = df["high"].values
-        close = df["close"].values
-        timestamp = df["timestamp"].values
+        high = np.ascontiguousarray(df["high"].to_numpy(dtype=np.float64))
+        low = np.ascontiguousarray(df["low"].to_numpy(dtype=np.float64))
+        close = np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64))
 
         n = len(df)
-        pump_window = int(self.config.pump_window)
-        pump_threshold = float(self.config.pump_threshold)
-
-        # Сбрасываем состояние для каждого символа
-        self.strategy.watchlist.clear()
-        self.position_manager.positions.clear()
-
-        for idx in range(pump_window, n):
-            # 1) поиск пампа (numba)
-            pump_item = self.scan_for_pumps_numba(symbol, high, close, idx, pump_window, pump_threshold)
-            if pump_item:
-                self.strategy.add_to_watchlist(pump_item)
-
-            # 2) обновляем watchlist
-            ready_items = self.strategy.update_watchlist(df, idx)
-
-            # 3) входы
-            for item in ready_items:
-                if self.portfolio.can_open_position():
-                    trade = self.strategy.check_entry_conditions(item, df, idx, self.position_manager)
-                    if trade:
-                        success, _ = self.position_manager.open_position(trade, df, idx)
-                        if success:
-                            self.portfolio.add_trade(trade)
-                            symbol_trades.append(trade)
-                            self.all_trades.append(trade)
-
-            # 4) TP/SL
-            closed = self.position_manager.check_positions(df, idx)
-
-            # 5) обновляем капитал по закрытым
-            for symbol_closed in closed.keys():
-                for tr in reversed(self.portfolio.trades):
-                    if tr.symbol == symbol_closed and tr.exit_time is not None:
-                        self.portfolio.update_capital(tr)
-                        break
-
-            # 6) equity snapshots
-            if idx % 4 == 0:
-                self.portfolio.record_snapshot(timestamp[idx], idx)
-
-        # ✅ ВАЖНО: закрываем все оставшиеся позиции по последней свече
-        last_idx = n - 1
-        forced_closed = self.position_manager.force_close_all(df, last_idx, reason="eod")
+        out_trades = np.empty((TRADE_FIELDS, n), dtype=np.float64)
+        out_snapshots = np.empty((SNAPSHOT_FIELDS, n // SNAPSHOT_EVERY + 1), dtype=np.float64)
+
+        params = make_kernel_params(self.config)
+        kernel = specialize_kernels(params)[0] if self.specialize else _run_symbol_kernel
+        n_trades, n_snaps, capital, peak_capital = kernel(
+            high,
+            low,
+            close,
+            params,
+            float(self.portfolio.current_capital),
+            float(self.portfolio.peak_capital),
+            True,
+            out_trades,
+            out_snapshots,
+        )
 
-        # ✅ И обновляем капитал по этим forced close
-        for tr in forced_closed:
-            # tr уже есть в portfolio.trades (мы добавляли при входе)
-            # просто обновим капитал
-            self.portfolio.update_capital(tr)
+        timestamps = df["timestamp"]
+        symbol_trades = self.build_trades(symbol, timestamps, out_trades, n_trades)
+        for trade in symbol_trades:
+            self.portfolio.add_trade(trade)
+        self.all_trades.extend(symbol_trades)
+
+        self.portfolio.current_capital = capital
+        self.portfolio.peak_capital = peak_capital
+
+        snap_idx = out_snapshots[S_IDX, :n_snaps].astype(np.int64)
+        cash = out_snapshots[S_CASH, :n_snaps]
+        open_count = out_snapshots[S_OPEN_COUNT, :n_snaps].astype(np.int64)
+        self.portfolio.extend_snapshots(
+            timestamp=df["timestamp"].values[snap_idx],
+            idx=snap_idx,
+            equity=cash,
+            cash=cash,
+            open_positions_value=open_count * float(self.config.trade_size_usdt),
+            open_positions_count=open_count,
+            drawdown=out_snapshots[S_DRAWDOWN, :n_snaps],
+        )
 
         return symbol_trades
 
+    def build_trades(self, symbol: str, timestamps: pd.Series, out_trades: np.ndarray, n_trades: int) -> List[Trade]:
+        """Сборка Trade из буфера ядра"""
+        cfg = self.config
+        trades: List[Trade] = []
+
+        for k in range(n_trades):
+            entry_idx = int(out_trades[T_ENTRY_IDX, k])
+            exit_idx = int(out_trades[T_EXIT_IDX, k])
+            position_size = float(out_trades[T_POSITION_SIZE, k])
+            fee = position_size * cfg.taker_fee
+
+            trade = Trade(
+                symbol=symbol,
+                trade_id=f"{symbol}_{entry_idx}_{next(self._trade_seq):08x}",
+                entry_time=timestamps.iat[entry_idx],
+                entry_idx=entry_idx,
+                entry_price=float(out_trades[T_ENTRY_PRICE, k]),
+                entry_fee=fee,
+                slippage_entry=cfg.slippage,
+                local_high=float(out_trades[T_LOCAL_HIGH, k]),
+                pump_start_time=timestamps.iat[int(out_trades[T_PUMP_START_IDX, k])],
+                pump_end_time=timestamps.iat[int(out_trades[T_PUMP_END_IDX, k])],
+                pump_percent=float(out_trades[T_PUMP_PERCENT, k]),
+                tp_price=float(out_trades[T_TP_PRICE, k]),
+                sl_price=float(out_trades[T_SL_PRICE, k]),
+                position_size=position_size,
+                exit_time=timestamps.iat[exit_idx],
+                exit_idx=exit_idx,
+                exit_price=float(out_trades[T_EXIT_PRICE, k]),
+                exit_fee=fee,
+                slippage_exit=cfg.slippage,
+                exit_reason=EXIT_REASONS[int(out_trades[T_EXIT_REASON, k])],
+                pnl_usdt=float(out_trades[T_PNL_USDT, k]),
+                pnl_percent=float(out_trades[T_PNL_PERCENT, k]),
+                fees_total=fee + fee,
+                slippage_total=cfg.slippage + cfg.slippage,
+                duration_bars=exit_idx - entry_idx,
+                duration_minutes=(exit_idx - entry_idx) * 15,
+                mfe=float(out_trades[T_MFE, k]),
+                mae=float(out_trades[T_MAE, k]),
+            )
+            trades.append(trade)
+
+            if not cfg.no_prints:
+                print(f"💰 {symbol} {trade.exit_reason}: PnL={trade.pnl_usdt:.2f} USDT ({trade.pnl_percent:.1f}%) | Размер: ${position_size:.2f}")
+
+        return trades
+
     @staticmethod
-    @njit
+    @njit(cache=True, fastmath=True, boundscheck=False)
     def detect_pump_numba(
         high: np.ndarray, close: np.ndarray, idx: int, pump_window: int, threshold: float
     ) -> Tuple[float, int, float]:
@@ -98,7 +519,7 @@ class Backtester:
         max_price = high[start_idx]
         max_idx = start_idx
 
-        for i in prange(start_idx + 1, idx + 1):
+        for i in range(start_idx + 1, idx + 1):
             if high[i] > max_price:
                 max_price = high[i]
                 max_idx = i
@@ -140,63 +561,52 @@ class Backtester:
         )
 
     def run_multiprocess(self, market_data: Dict[str, pd.DataFrame]) -> List[Trade]:
-        """Мультипроцессинговый запуск с joblib (важно: тоже делаем EOD close)"""
-        from joblib import Parallel, delayed
+        """Параллельный запуск: все символы в одном процессе через numba prange (с EOD close)"""
         import time
         import sys
 
         total = len(market_data)
         items = list(market_data.items())
 
-        print(f"\n🚀 Запуск бэктеста на {total} символах (n_jobs=-2)")
+        print(f"\n🚀 Запуск бэктеста на {total} символах (numba prange)")
         sys.stdout.flush()
 
-        start_time = time.time()
-
-        config_dict = self.config.__dict__.copy()
-
-        def worker(symbol: str, df: pd.DataFrame, cfg: Dict) -> List[Trade]:
-            cfg_obj = StrategyConfig(**cfg)
-            strategy = StrategyEngine(cfg_obj)
-            position_manager = PositionManager(cfg_obj)
-
-            symbol_trades: List[Trade] = []
+        if not items:
+            self.all_trades = []
+            return self.all_trades
 
-            strategy.watchlist.clear()
-            position_manager.positions.clear()
-
-            pump_window = int(cfg["pump_window"])
-
-            for idx in range(pump_window, len(df)):
-                pump_item = strategy.scan_for_pumps(symbol, df, idx)
-                if pump_item:
-                    strategy.add_to_watchlist(pump_item)
-
-                ready_items = strategy.update_watchlist(df, idx)
-
-                for item in ready_items:
-                    trade = strategy.check_entry_conditions(item, df, idx, position_manager)
-                    if trade:
-                        success, _ = position_manager.open_position(trade, df, idx)
-                        if success:
-                            symbol_trades.append(trade)
-
-                position_manager.check_positions(df, idx)
-
-            # ✅ закрываем остаток позиций на последней свече
-            last_idx = len(df) - 1
-            position_manager.force_close_all(df, last_idx, reason="eod")
-
-            return symbol_trades
+        start_time = time.time()
 
-        results = Parallel(n_jobs=-2, backend="loky")(
-            delayed(worker)(symbol, df, config_dict) for symbol, df in tqdm(items, desc="Прогресс")
+        lengths = np.array([len(df) for _, df in items], dtype=np.int64)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        all_high = np.concatenate([df["high"].to_numpy(dtype=np.float64) for _, df in items])
+        all_low = np.concatenate([df["low"].to_numpy(dtype=np.float64) for _, df in items])
+        all_close = np.concatenate([df["close"].to_numpy(dtype=np.float64) for _, df in items])
+
+        out_trades = np.empty((TRADE_FIELDS, int(ends[-1])), dtype=np.float64)
+        out_counts = np.zeros(total, dtype=np.int64)
+
+        params = make_kernel_params(self.config)
+        kernel = specialize_kernels(params)[1] if self.specialize else _run_all_symbols
+        kernel(
+            all_high,
+            all_low,
+            all_close,
+            starts,
+            ends,
+            params,
+            out_trades,
+            out_counts,
         )
 
         all_trades: List[Trade] = []
-        for trades in results:
-            if trades:
-                all_trades.extend(trades)
+        for s, (symbol, df) in enumerate(items):
+            if out_counts[s]:
+                all_trades.extend(self.build_trades(
+                    symbol, df["timestamp"], out_trades[:, starts[s]:ends[s]], int(out_counts[s])
+                ))
 
         elapsed = time.time() - start_time
         print(f"\n✅ Бэктест завершен за {elapsed:.1f}с")
@@ -243,10 +653,11 @@ class Backtester:
 
         print(f"\n💰 Нереализованная прибыль: {unrealized_pnl:.2f} USDT")
 
+        equity_history = self.portfolio.equity_history
         analyzer = MetricsAnalyzer()
         metrics = analyzer.calculate_all_metrics(
             self.all_trades,
-            self.portfolio.equity_history,
+            equity_history,
             self.portfolio.initial_capital,
             self.position_manager.positions,
         )
@@ -270,7 +681,7 @@ class Backtester:
         print(f"   Нереализованная PNL: {unrealized_pnl:.2f} USDT")
         print(f"   Итоговый капитал: {total_equity:.2f} USDT")
 
-        metrics["equity_history"] = self.portfolio.equity_history
+        metrics["equity_history"] = equity_history
         metrics["open_positions"] = len(self.position_manager.positions)
 
         self.results_exporter.export_all_trades(self.all_trades, metrics)
@@ -1,20 +1,33 @@
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
 import re
 
-rows = []
-for summary in Path(".").rglob("summary.json"):
-    if "out_grid48_" not in str(summary):
-        continue
+PARAMS_RE = re.compile(r"p([0-9.]+)_tp([0-9.]+)_s([0-9]+)")
 
+
+def read_summary(summary):
     try:
-        data = json.loads(summary.read_text(encoding="utf-8"))
+        return summary, json.loads(summary.read_bytes())
     except Exception:
+        return summary, None
+
+
+paths = [p for p in Path(".").rglob("summary.json") if "out_grid48_" in str(p)]
+
+# Чтение и парсинг мелких json упираются в I/O - читаем пачкой в потоках
+with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+    summaries = list(executor.map(read_summary, paths))
+
+rows = []
+for summary, data in summaries:
+    if data is None:
         continue
 
     name = summary.parent.name
-    m = re.search(r"p([0-9.]+)_tp([0-9.]+)_s([0-9]+)", name)
+    m = PARAMS_RE.search(name)
     if m:
         pump = float(m.group(1))
         tp = float(m.group(2))
@@ -1,99 +1,201 @@
+import argparse
 import json
+import orjson
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
 import re
+import matplotlib
+matplotlib.use('Agg')  # только сохраняем png, GUI не нужен
 import matplotlib.pyplot as plt
 import numpy as np
 from tabulate import tabulate
 
-def load_all_results():
-    """Загрузка всех результатов из папки out_top_grid"""
-    rows = []
+TRADES_COLUMNS = ['exit_reason', 'pnl_usdt', 'symbol']
+
+# Схема для Arrow-парсера: строковые колонки сразу словарями (-> category в pandas)
+TRADES_SCHEMA = pa.schema([
+    ('exit_reason', pa.dictionary(pa.int32(), pa.string())),
+    ('pnl_usdt', pa.float64()),
+    ('symbol', pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Колонки таблицы тестов и их типы
+RESULT_COLUMNS = [
+    ('test', object),
+    ('folder', object),
+    ('pump', np.float64),
+    ('tp', np.float64),
+    ('stall', np.int64),
+    ('sl', np.float64),
+    ('trades', np.int64),
+    ('pnl', np.float64),
+    ('winrate', np.float64),
+    ('profit_factor', np.float64),
+    ('avg_win', np.float64),
+    ('avg_loss', np.float64),
+    ('max_drawdown', np.float64),
+    ('sharpe', np.float64),
+]
+
+# Имя папки теста: p{pump*100}_tp{tp*100}_s{stall}_sl{sl*10}.
+# Поля ищутся независимо - неполные имена тоже разбираются
+PUMP_RE = re.compile(r'p(\d+)')
+TP_RE = re.compile(r'tp(\d+)')
+STALL_RE = re.compile(r's(\d+)')
+SL_RE = re.compile(r'sl(\d+)')
+
+def load_trades(folder):
+    """
+    Сделки теста: только нужные колонки.
+    trades_all.csv один раз конвертируется в trades_all.parquet рядом,
+    дальше читается колоночный parquet (пока csv не новее его)
+    """
+    trades_file = folder / "trades_all.csv"
+    parquet_file = folder / "trades_all.parquet"
+    
+    if parquet_file.exists() and (not trades_file.exists()
+                                  or parquet_file.stat().st_mtime >= trades_file.stat().st_mtime):
+        return pd.read_parquet(parquet_file, columns=TRADES_COLUMNS)
+    
+    if not trades_file.exists():
+        return None
+    
+    # Многопоточный Arrow-парсер; пустые строки -> null, как NaN у pandas
+    table = pacsv.read_csv(trades_file, convert_options=pacsv.ConvertOptions(
+        column_types=TRADES_SCHEMA,
+        include_columns=TRADES_COLUMNS,
+        strings_can_be_null=True,
+    ))
+    trades_df = table.to_pandas()
+    # Arrow упорядочивает словарь по первому появлению, pandas - по алфавиту
+    for col in ['exit_reason', 'symbol']:
+        trades_df[col] = trades_df[col].cat.reorder_categories(sorted(trades_df[col].cat.categories))
+    try:
+        trades_df.to_parquet(parquet_file, index=False)
+    except (OSError, pa.ArrowException) as e:
+        # Без кэша тест просто читается из csv; недописанный parquet иначе читался бы как свежий
+        print(f"⚠️ Не удалось сохранить {parquet_file}: {e}")
+        parquet_file.unlink(missing_ok=True)
+    return trades_df
+
+def load_one_result(folder):
+    """
+    Загрузка одного теста: (значения колонок RESULT_COLUMNS, сделки).
+    None если это не папка теста
+    """
+    if not folder.is_dir():
+        return None
     
-    for folder in Path("out_top_grid").iterdir():
-        if not folder.is_dir():
-            continue
+    summary_file = folder / "summary.json"
+    if not summary_file.exists():
+        return None
+    
+    try:
+        raw = summary_file.read_bytes()
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # profit_factor = inf без убыточных сделок: json.dump пишет Infinity, orjson его не читает
+            data = json.loads(raw)
         
-        summary_file = folder / "summary.json"
-        if not summary_file.exists():
-            continue
+        # Парсим имя папки
+        name = folder.name
+        params = {}
         
-        try:
-            with open(summary_file, encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Парсим имя папки
-            name = folder.name
-            params = {}
-            
-            pump_match = re.search(r'p(\d+)', name)
-            tp_match = re.search(r'tp(\d+)', name)
-            stall_match = re.search(r's(\d+)', name)
-            sl_match = re.search(r'sl(\d+)', name)
-            
-            if pump_match:
-                params['pump'] = float(pump_match.group(1)) / 100
-            if tp_match:
-                params['tp'] = float(tp_match.group(1)) / 100
-            if stall_match:
-                params['stall'] = int(stall_match.group(1))
-            if sl_match:
-                params['sl'] = float(sl_match.group(1)) / 10
-            
-            # Загружаем trades_all.csv для детального анализа
-            trades_file = folder / "trades_all.csv"
-            trades_df = None
-            if trades_file.exists():
-                trades_df = pd.read_csv(trades_file)
-                trades_df['exit_reason'] = trades_df['exit_reason'].fillna('unknown')
-            
-            rows.append({
-                'test': name,
-                'folder': str(folder),
-                'pump': params.get('pump', 0),
-                'tp': params.get('tp', 0),
-                'stall': params.get('stall', 0),
-                'sl': params.get('sl', 0),
-                'trades': data.get('total_trades', 0),
-                'pnl': round(data.get('total_pnl_usdt', 0), 2),
-                'winrate': round(data.get('win_rate', 0), 1),
-                'profit_factor': round(data.get('profit_factor', 0), 2),
-                'avg_win': round(data.get('avg_win', 0), 2),
-                'avg_loss': round(data.get('avg_loss', 0), 2),
-                'max_drawdown': round(data.get('max_drawdown', 0), 2),
-                'sharpe': round(data.get('sharpe_ratio', 0), 2),
-                'trades_df': trades_df
-            })
-        except Exception as e:
-            print(f"⚠️ Ошибка загрузки {folder}: {e}")
-    
-    return rows
+        pump_match = PUMP_RE.search(name)
+        tp_match = TP_RE.search(name)
+        stall_match = STALL_RE.search(name)
+        sl_match = SL_RE.search(name)
+        
+        if pump_match:
+            params['pump'] = float(pump_match.group(1)) / 100
+        if tp_match:
+            params['tp'] = float(tp_match.group(1)) / 100
+        if stall_match:
+            params['stall'] = int(stall_match.group(1))
+        if sl_match:
+            params['sl'] = float(sl_match.group(1)) / 10
+        
+        # Загружаем сделки для детального анализа
+        trades_df = load_trades(folder)
+        if trades_df is not None:
+            # Строковые колонки держим категориями: коды вместо python-строк.
+            # astype - на случай parquet, записанного до перехода на категории
+            reasons = trades_df['exit_reason'].astype('category')
+            if 'unknown' not in reasons.cat.categories:
+                reasons = reasons.cat.add_categories(['unknown'])
+            trades_df['exit_reason'] = reasons.fillna('unknown')
+            trades_df['symbol'] = trades_df['symbol'].astype('category')
+        
+        # Значения в порядке RESULT_COLUMNS
+        values = (
+            name,
+            str(folder),
+            params.get('pump', 0),
+            params.get('tp', 0),
+            params.get('stall', 0),
+            params.get('sl', 0),
+            data.get('total_trades', 0),
+            round(data.get('total_pnl_usdt', 0), 2),
+            round(data.get('win_rate', 0), 1),
+            round(data.get('profit_factor', 0), 2),
+            round(data.get('avg_win', 0), 2),
+            round(data.get('avg_loss', 0), 2),
+            round(data.get('max_drawdown', 0), 2),
+            round(data.get('sharpe_ratio', 0), 2),
+        )
+        return values, trades_df
+    except Exception as e:
+        print(f"⚠️ Ошибка загрузки {folder}: {e}")
+        return None
+
+def load_all_results():
+    """
+    Загрузка всех результатов из папки out_top_grid.
+    Возвращает (df, trades_dfs): таблица тестов по колонкам и сделки i-го теста в trades_dfs[i]
+    """
+    folders = list(Path("out_top_grid").iterdir())
+    
+    # Папки читаются независимо - упираемся в диск, поэтому потоки.
+    # map сохраняет порядок папок
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = [r for r in executor.map(load_one_result, folders) if r is not None]
+    
+    # Собираем по колонкам сразу в типизированные массивы
+    n = len(results)
+    columns = {name: np.empty(n, dtype=dtype) for name, dtype in RESULT_COLUMNS}
+    trades_dfs = []
+    for i, (values, trades_df) in enumerate(results):
+        for (name, _), value in zip(RESULT_COLUMNS, values):
+            columns[name][i] = value
+        trades_dfs.append(trades_df)
+    
+    return pd.DataFrame(columns), trades_dfs
 
 def analyze_exit_reasons(trades_df):
     """Анализ причин выхода из сделок"""
     if trades_df is None or len(trades_df) == 0:
         return {}
     
-    reasons = trades_df['exit_reason'].value_counts()
-    total = len(trades_df)
-    
-    result = {}
-    for reason, count in reasons.items():
-        pnl = trades_df[trades_df['exit_reason'] == reason]['pnl_usdt'].sum()
-        result[reason] = {
-            'count': count,
-            'percentage': (count / total) * 100,
-            'pnl': round(pnl, 2),
-            'avg_pnl': round(pnl / count, 2) if count > 0 else 0
-        }
+    # Один groupby вместо маски на каждую причину; порядок причин - как у value_counts.
+    # Сумма - через Series.sum группы: groupby.sum суммирует по Кэхэну и расходится в последнем бите
+    counts = trades_df['exit_reason'].value_counts()
+    pnl = trades_df.groupby('exit_reason', observed=True)['pnl_usdt'].agg(lambda s: s.sum()).reindex(counts.index)
+    result = pd.DataFrame({
+        'count': counts,
+        'percentage': counts / len(trades_df) * 100,
+        'pnl': pnl.round(2),
+        'avg_pnl': (pnl / counts).round(2),  # среднее по сумме до округления
+    })
     
-    return result
+    return result.to_dict(orient='index')
 
-def create_comparison_table(rows):
+def create_comparison_table(df):
     """Создание детальной таблицы сравнения"""
-    df = pd.DataFrame(rows)
-    
-    # Убираем колонку с DataFrame для таблицы
     display_cols = ['test', 'pump', 'tp', 'stall', 'sl', 'trades', 'pnl', 'winrate', 
                    'profit_factor', 'avg_win', 'avg_loss', 'max_drawdown', 'sharpe']
     
@@ -107,26 +209,60 @@ def analyze_parameter_sensitivity(df):
     print("="*80)
     
     results = {}
+    params = [param for param in ['pump', 'tp', 'stall', 'sl'] if param in df.columns]
+    if not params:
+        return results
     
-    for param in ['pump', 'tp', 'stall', 'sl']:
-        if param in df.columns:
-            print(f"\n🔍 По параметру: {param.upper()}")
-            
-            # Группировка по параметру
-            grouped = df.groupby(param).agg({
-                'pnl': ['mean', 'max', 'min', 'std'],
-                'winrate': 'mean',
-                'trades': 'sum',
-                'profit_factor': 'mean'
-            }).round(2)
-            
-            grouped.columns = ['_'.join(col).strip() for col in grouped.columns.values]
-            print(tabulate(grouped, headers='keys', tablefmt='grid', floatfmt='.2f'))
-            
-            results[param] = grouped
+    # Все параметры за один groupby: длинная форма (param, val) -> метрики
+    long = df.melt(id_vars=['pnl', 'winrate', 'trades', 'profit_factor'], value_vars=params,
+                   var_name='param', value_name='val')
+    agg = long.groupby(['param', 'val']).agg(
+        pnl_mean=('pnl', 'mean'),
+        pnl_max=('pnl', 'max'),
+        pnl_min=('pnl', 'min'),
+        pnl_std=('pnl', 'std'),
+        winrate_mean=('winrate', 'mean'),
+        trades_sum=('trades', 'sum'),
+        profit_factor_mean=('profit_factor', 'mean'),
+    ).round(2)
+    
+    for param in params:
+        print(f"\n🔍 По параметру: {param.upper()}")
+        
+        # Возвращаем индексу имя и тип исходной колонки (stall - целые)
+        grouped = agg.loc[param]
+        grouped.index = grouped.index.astype(df[param].dtype).rename(param)
+        print(tabulate(grouped, headers='keys', tablefmt='grid', floatfmt='.2f'))
+        
+        results[param] = grouped
     
     return results
 
+def top_k(df, col, k=3, largest=True):
+    """
+    Топ-k строк по колонке через частичную сортировку (np.partition) вместо полной.
+    Порядок и выбор при равенствах - как у nlargest/nsmallest (keep='first');
+    NaN в отбор не входят и, как там же, только добивают результат, если чисел меньше k
+    """
+    v = df[col].to_numpy(dtype=np.float64)
+    is_nan = np.isnan(v)
+    valid = np.flatnonzero(~is_nan)
+    nan_fill = np.flatnonzero(is_nan)[:max(k - len(valid), 0)]
+    v = v[valid]
+    k = min(k, len(v))
+    if k == 0:
+        return df.iloc[nan_fill]
+    
+    if largest:
+        kth = np.partition(v, len(v) - k)[len(v) - k]
+        cand = np.flatnonzero(v >= kth)
+        order = np.argsort(-v[cand], kind='stable')
+    else:
+        kth = np.partition(v, k - 1)[k - 1]
+        cand = np.flatnonzero(v <= kth)
+        order = np.argsort(v[cand], kind='stable')
+    return df.iloc[np.concatenate([valid[cand[order[:k]]], nan_fill])]
+
 def find_best_parameters(df):
     """Поиск лучших параметров"""
     print("\n" + "="*80)
@@ -134,56 +270,58 @@ def find_best_parameters(df):
     print("="*80)
     
     # По максимальной прибыли
-    best_pnl = df.nlargest(3, 'pnl')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'profit_factor']]
+    best_pnl = top_k(df, 'pnl')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'profit_factor']]
     print("\n📈 ТОП-3 ПО ПРИБЫЛИ:")
     print(tabulate(best_pnl, headers='keys', tablefmt='grid', floatfmt='.2f'))
     
     # По максимальному profit factor
-    best_pf = df.nlargest(3, 'profit_factor')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'profit_factor']]
+    best_pf = top_k(df, 'profit_factor')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'profit_factor']]
     print("\n🔥 ТОП-3 ПО PROFIT FACTOR:")
     print(tabulate(best_pf, headers='keys', tablefmt='grid', floatfmt='.2f'))
     
     # По минимальной просадке
-    best_dd = df.nsmallest(3, 'max_drawdown')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'max_drawdown']]
+    best_dd = top_k(df, 'max_drawdown', largest=False)[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'max_drawdown']]
     print("\n🛡️ ТОП-3 ПО МИНИМАЛЬНОЙ ПРОСАДКЕ:")
     print(tabulate(best_dd, headers='keys', tablefmt='grid', floatfmt='.2f'))
     
     # По коэффициенту Шарпа
     if 'sharpe' in df.columns:
-        best_sharpe = df.nlargest(3, 'sharpe')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'sharpe']]
+        best_sharpe = top_k(df, 'sharpe')[['test', 'pump', 'tp', 'stall', 'sl', 'pnl', 'winrate', 'sharpe']]
         print("\n📊 ТОП-3 ПО КОЭФФИЦИЕНТУ ШАРПА:")
         print(tabulate(best_sharpe, headers='keys', tablefmt='grid', floatfmt='.2f'))
 
-def analyze_exit_reasons_all(rows):
+def analyze_exit_reasons_all(df, trades_dfs):
     """Анализ причин выхода для всех тестов"""
     print("\n" + "="*80)
     print("🚪 АНАЛИЗ ПРИЧИН ВЫХОДА ИЗ СДЕЛОК")
     print("="*80)
     
-    exit_data = []
-    for row in rows:
-        if row['trades_df'] is not None:
-            reasons = analyze_exit_reasons(row['trades_df'])
-            
-            exit_row = {
-                'test': row['test'],
-                'tp_count': reasons.get('tp', {}).get('count', 0),
-                'tp_pnl': reasons.get('tp', {}).get('pnl', 0),
-                'sl_count': reasons.get('sl', {}).get('count', 0),
-                'sl_pnl': reasons.get('sl', {}).get('pnl', 0),
-                'eod_count': reasons.get('eod', {}).get('count', 0),
-                'eod_pnl': reasons.get('eod', {}).get('pnl', 0),
-            }
-            exit_data.append(exit_row)
-    
-    exit_df = pd.DataFrame(exit_data)
+    tests = [(test, trades_df) for test, trades_df in zip(df['test'], trades_dfs) if trades_df is not None]
+    exit_df = pd.DataFrame({'test': [test for test, _ in tests]})
+    
+    if tests:
+        # Все сделки в одну таблицу с номером теста и один groupby на всех
+        big = pd.concat(
+            [trades_df[['exit_reason', 'pnl_usdt']].assign(_pos=i) for i, (_, trades_df) in enumerate(tests)],
+            ignore_index=True, copy=False
+        )
+        agg = big.groupby(['_pos', 'exit_reason'], observed=True)['pnl_usdt'].agg(count='size', pnl='sum')
+        agg['pnl'] = agg['pnl'].round(2)
+        # Тесты без сделок и отсутствующие причины - нули
+        agg = agg.unstack('exit_reason', fill_value=0).reindex(range(len(tests)), fill_value=0)
+        
+        for reason in ['tp', 'sl', 'eod']:
+            for stat in ['count', 'pnl']:
+                col = (stat, reason)
+                exit_df[f'{reason}_{stat}'] = agg[col].to_numpy() if col in agg.columns else 0
+    
     if not exit_df.empty:
         print("\n📊 Детальный анализ причин выхода (топ-10 по прибыли):")
         exit_df['tp_ratio'] = (exit_df['tp_count'] / exit_df[['tp_count', 'sl_count', 'eod_count']].sum(axis=1)) * 100
         exit_df = exit_df.sort_values('tp_pnl', ascending=False).head(10)
         print(tabulate(exit_df, headers='keys', tablefmt='grid', floatfmt='.2f'))
 
-def create_visualizations(df, rows):
+def create_visualizations(df, trades_dfs):
     """Создание графиков"""
     try:
         fig, axes = plt.subplots(2, 2, figsize=(15, 10))
@@ -212,13 +350,14 @@ def create_visualizations(df, rows):
         
         # 3. Топ-10 монет по прибыли (из лучшего теста)
         ax = axes[1, 0]
-        if rows:
-            best_test = max(rows, key=lambda x: x['pnl'])
-            if best_test['trades_df'] is not None:
-                symbol_pnl = best_test['trades_df'].groupby('symbol')['pnl_usdt'].sum().sort_values(ascending=False).head(10)
+        if len(df):
+            best_pos = df['pnl'].argmax()
+            best_trades = trades_dfs[best_pos]
+            if best_trades is not None:
+                symbol_pnl = best_trades.groupby('symbol', observed=True)['pnl_usdt'].sum().sort_values(ascending=False).head(10)
                 colors = ['green' if x > 0 else 'red' for x in symbol_pnl.values]
                 ax.barh(range(len(symbol_pnl)), symbol_pnl.values, color=colors[::-1])
-                ax.set_title(f"Топ-10 монет по прибыли\n(лучший тест: {best_test['test']})")
+                ax.set_title(f"Топ-10 монет по прибыли\n(лучший тест: {df['test'].iloc[best_pos]})")
                 ax.set_xlabel('PnL (USDT)')
                 ax.set_yticks(range(len(symbol_pnl)))
                 ax.set_yticklabels(symbol_pnl.index[::-1])
@@ -227,11 +366,11 @@ def create_visualizations(df, rows):
         # 4. Распределение TP/SL/EOD
         ax = axes[1, 1]
         exit_data = []
-        for row in rows[:5]:  # Топ-5 тестов
-            if row['trades_df'] is not None:
-                reasons = row['trades_df']['exit_reason'].value_counts()
+        for test, trades_df in zip(df['test'][:5], trades_dfs[:5]):  # Топ-5 тестов
+            if trades_df is not None:
+                reasons = trades_df['exit_reason'].value_counts()
                 exit_data.append({
-                    'test': row['test'][:20],
+                    'test': test[:20],
                     'TP': reasons.get('tp', 0),
                     'SL': reasons.get('sl', 0),
                     'EOD': reasons.get('eod', 0)
@@ -255,28 +394,30 @@ def create_visualizations(df, rows):
         print(f"⚠️ Ошибка создания графиков: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Анализ результатов grid поиска')
+    parser.add_argument('--no-plot', action='store_true',
+                        help='Не строить графики (только таблицы и файлы)')
+    args = parser.parse_args()
+    
     print("\n" + "="*80)
     print("📊 ДЕТАЛЬНЫЙ АНАЛИЗ РЕЗУЛЬТАТОВ GRID ПОИСКА")
     print("="*80)
     
     # Загружаем все результаты
     print("\n📂 Загрузка результатов...")
-    rows = load_all_results()
+    df, trades_dfs = load_all_results()
     
-    if not rows:
+    if df.empty:
         print("❌ Нет результатов в папке out_top_grid/")
         return
     
-    print(f"✅ Загружено {len(rows)} тестов")
-    
-    # Создаем DataFrame для анализа
-    df = pd.DataFrame(rows)
+    print(f"✅ Загружено {len(df)} тестов")
     
     # 1. Детальная таблица сравнения
     print("\n" + "="*80)
     print("📊 ДЕТАЛЬНАЯ ТАБЛИЦА СРАВНЕНИЯ")
     print("="*80)
-    comparison = create_comparison_table(rows)
+    comparison = create_comparison_table(df)
     print(tabulate(comparison.head(20), headers='keys', tablefmt='grid', floatfmt='.2f'))
     
     # 2. Анализ чувствительности
@@ -286,32 +427,39 @@ def main():
     best_params = find_best_parameters(df)
     
     # 4. Анализ причин выхода
-    exit_analysis = analyze_exit_reasons_all(rows)
-    
-    # 5. Создание визуализаций
-    create_visualizations(df, rows)
+    exit_analysis = analyze_exit_reasons_all(df, trades_dfs)
     
-    # 6. Сохраняем полные результаты
+    # 5. Сохраняем полные результаты
     output_file = 'out_top_grid/full_comparison.csv'
     comparison.to_csv(output_file, index=False)
     print(f"\n💾 Полная таблица сохранена в {output_file}")
     
-    # 7. Сохраняем JSON с лучшими параметрами
+    # 6. Сохраняем JSON с лучшими параметрами
+    # Каждый argmax/argmin - один раз, дальше только позиционный доступ
+    i_pnl = df['pnl'].to_numpy().argmax()
+    i_pf = df['profit_factor'].to_numpy().argmax()
+    i_sharpe = df['sharpe'].to_numpy().argmax() if 'sharpe' in df.columns else None
+    i_dd = df['max_drawdown'].to_numpy().argmin()
+    test_col = df.columns.get_loc('test')
+    
     best_config = {
-        'best_by_pnl': rows[df['pnl'].argmax()]['test'],
-        'best_by_profit_factor': rows[df['profit_factor'].argmax()]['test'],
-        'best_by_sharpe': rows[df['sharpe'].argmax()]['test'] if 'sharpe' in df.columns else None,
-        'best_by_drawdown': rows[df['max_drawdown'].argmin()]['test'],
+        'best_by_pnl': df.iat[i_pnl, test_col],
+        'best_by_profit_factor': df.iat[i_pf, test_col],
+        'best_by_sharpe': df.iat[i_sharpe, test_col] if i_sharpe is not None else None,
+        'best_by_drawdown': df.iat[i_dd, test_col],
         'top_parameters': {
-            'pump': float(df.loc[df['pnl'].argmax(), 'pump']),
-            'tp': float(df.loc[df['pnl'].argmax(), 'tp']),
-            'stall': int(df.loc[df['pnl'].argmax(), 'stall']),
-            'sl': float(df.loc[df['pnl'].argmax(), 'sl']),
+            'pump': float(df.iat[i_pnl, df.columns.get_loc('pump')]),
+            'tp': float(df.iat[i_pnl, df.columns.get_loc('tp')]),
+            'stall': int(df.iat[i_pnl, df.columns.get_loc('stall')]),
+            'sl': float(df.iat[i_pnl, df.columns.get_loc('sl')]),
         }
     }
     
-    with open('out_top_grid/best_config.json', 'w', encoding='utf-8') as f:
-        json.dump(best_config, f, indent=2, ensure_ascii=False)
+    Path('out_top_grid/best_config.json').write_bytes(orjson.dumps(best_config, option=orjson.OPT_INDENT_2))
+    
+    # 7. Графики - в основном потоке, после таблиц: pyplot не потокобезопасен
+    if not args.no_plot:
+        create_visualizations(df, trades_dfs)
     
     print("\n" + "="*80)
     print("✅ АНАЛИЗ ЗАВЕРШЕН")
@@ -1,16 +1,69 @@
 from pybit.unified_trading import HTTP
+import aiohttp
+import asyncio
+import json
+import orjson
 import pandas as pd
 import numpy as np
+from numba import njit
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 import logging
-from datetime import datetime, timedelta
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Колонки parquet-кэша: время свечи (datetime64[ns], UTC), OHLCV в float64 и производные
+# из _build_frame в float32. Хранится весь кадр целиком, при чтении ничего не пересчитывается
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+CACHE_COLUMNS = OHLCV_COLUMNS + ['returns', 'range_pct', 'funding_rate']
+CACHE_READ_WORKERS = 8  # потоков для чтения parquet-кэша при старте
+# Версия формата кэша входит в имя файла: файлы других версий не читаются и качаются заново.
+# 2 - время свечей в UTC (в версии без номера было локальное время машины)
+CACHE_VERSION = 2
+
+BYBIT_KLINE_URL = "https://api.bybit.com/v5/market/kline"
+KLINE_BATCH_LIMIT = 1000
+
+# Список USDT perpetual меняется редко - держим его в кэше сутки
+SYMBOLS_CACHE_FILE = 'usdt_perp_symbols.json'
+SYMBOLS_CACHE_TTL = 24 * 3600
+
+
+@njit(cache=True)
+def _dedup_sort(ts: np.ndarray, start_ms: int, end_ms: int) -> np.ndarray:
+    """
+    Индексы свечей в [start_ms, end_ms] по возрастанию времени, без дублей
+    (остается первое вхождение). Перевернутые пачки API обычно уже отсортированы -
+    тогда обходимся одним линейным проходом без сортировки
+    """
+    n = len(ts)
+    is_sorted = True
+    for i in range(1, n):
+        if ts[i] < ts[i - 1]:
+            is_sorted = False
+            break
+
+    if is_sorted:
+        order = np.arange(n)
+    else:
+        order = np.argsort(ts, kind='mergesort')  # стабильная: первое вхождение впереди
+
+    out = np.empty(n, dtype=np.int64)
+    count = 0
+    for j in range(n):
+        i = order[j]
+        t = ts[i]
+        if t < start_ms or t > end_ms:
+            continue
+        if count > 0 and ts[out[count - 1]] == t:
+            continue
+        out[count] = i
+        count += 1
+    return out[:count]
+
 class BybitDataLoader:
     """Загрузчик данных из Bybit API"""
     
@@ -39,7 +92,12 @@ class BybitDataLoader:
         }
         
     def get_usdt_perpetual_symbols(self, limit: int = None) -> List[str]:
-        """Получение списка USDT perpetual фьючерсов"""
+        """Получение списка USDT perpetual фьючерсов (с кэшем на SYMBOLS_CACHE_TTL)"""
+        symbols = self._read_symbols_cache()
+        if symbols is not None:
+            print(f"✅ {len(symbols)} USDT perpetual из кэша")
+            return symbols[:limit] if limit else symbols
+        
         try:
             print("🔍 Получаю список USDT perpetual...")
             
@@ -55,6 +113,8 @@ class BybitDataLoader:
                     if item['quoteCoin'] == 'USDT' and item.get('contractType') == 'LinearPerpetual':
                         symbols.append(item['symbol'])
                 
+                self._write_symbols_cache(symbols)
+                
                 if limit:
                     symbols = symbols[:limit]
                 
@@ -68,96 +128,201 @@ class BybitDataLoader:
             print(f"❌ Ошибка при получении символов: {e}")
             return []
     
+    @staticmethod
+    def _build_frame(timestamps, open_, high, low, close, volume) -> pd.DataFrame:
+        """
+        Свечи + производные колонки (returns, range_pct, funding_rate) из массивов.
+        Номер свечи - это позиция строки (df.index), отдельной колонки idx нет.
+        Производные - float32: для отношений точности хватает, а байт вдвое меньше
+        """
+        returns = np.empty(len(close), dtype=np.float32)
+        returns[:1] = np.nan
+        returns[1:] = close[1:] / close[:-1] - 1  # как pct_change
+        
+        return pd.DataFrame({
+            'timestamp': timestamps,
+            'open': open_,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+            'returns': returns,
+            'range_pct': ((high - low) / low * 100).astype(np.float32),
+            'funding_rate': np.full(len(close), 0.0001, dtype=np.float32),
+        })
+    
+    def _read_symbols_cache(self) -> Optional[List[str]]:
+        """Список символов из кэша, None если кэша нет или он устарел"""
+        cache_file = self.cache_dir / SYMBOLS_CACHE_FILE
+        try:
+            if cache_file.stat().st_mtime < time.time() - SYMBOLS_CACHE_TTL:
+                return None
+            with open(cache_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_symbols_cache(self, symbols: List[str]):
+        """Атомарная запись: пишем во временный файл и подменяем"""
+        cache_file = self.cache_dir / SYMBOLS_CACHE_FILE
+        tmp_file = cache_file.with_suffix('.tmp')
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(symbols, f)
+            tmp_file.replace(cache_file)
+        except OSError:
+            pass
+    
     def get_klines(self, symbol: str, interval: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
         """Загрузка ВСЕХ свечей за период с правильной пагинацией"""
         
         interval_str = self.interval_map.get(interval, '15')
+        start_ms, end_ms = self._date_range_ms(start_date, end_date)
         
-        start_dt = pd.to_datetime(start_date)
-        end_dt = pd.to_datetime(end_date)
+        all_klines = []
+        current_end = end_ms
+        batch_limit = KLINE_BATCH_LIMIT
         
-        start_ms = int(start_dt.timestamp() * 1000)
-        end_ms = int(end_dt.timestamp() * 1000)
+        while current_end > start_ms:
+            try:
+                response = self.session.get_kline(
+                    category="linear",
+                    symbol=symbol,
+                    interval=interval_str,
+                    start=start_ms,
+                    end=current_end,
+                    limit=batch_limit
+                )
+                
+                if response['retCode'] != 0:
+                    if "too many requests" in response['retMsg'].lower():
+                        time.sleep(1)
+                        continue
+                    else:
+                        break
+                
+                data = response['result']['list']
+                if not data:
+                    break
+                
+                all_klines.extend(data)
+                
+                # Берем самую старую свечу в пачке
+                oldest_ts = int(data[-1][0])
+                
+                # Если дошли до старта - выходим
+                if oldest_ts <= start_ms:
+                    break
+                
+                current_end = oldest_ts - 1
+                time.sleep(0.05)
+                
+            except Exception as e:
+                print(f"  ❌ Ошибка {symbol}: {e}")
+                break
+        
+        return self._klines_to_frame(all_klines, start_ms, end_ms)
+    
+    async def _fetch_klines(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                            symbol: str, interval: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """Асинхронная загрузка свечей за период: та же пагинация, что в get_klines, но без потоков"""
+        interval_str = self.interval_map.get(interval, '15')
+        start_ms, end_ms = self._date_range_ms(start_date, end_date)
         
         all_klines = []
         current_end = end_ms
-        batch_limit = 1000
         
-        print(f"  Загрузка {symbol}...")
-        
-        with tqdm(desc=f"{symbol}", leave=False, position=1) as pbar:
-            while current_end > start_ms:
-                try:
-                    response = self.session.get_kline(
-                        category="linear",
-                        symbol=symbol,
-                        interval=interval_str,
-                        start=start_ms,
-                        end=current_end,
-                        limit=batch_limit
-                    )
-                    
-                    if response['retCode'] != 0:
-                        if "too many requests" in response['retMsg'].lower():
-                            time.sleep(1)
-                            continue
-                        else:
-                            break
-                    
-                    data = response['result']['list']
-                    if not data:
-                        break
-                    
-                    all_klines.extend(data)
-                    pbar.update(len(data))
-                    
-                    # Берем самую старую свечу в пачке
-                    oldest_ts = int(data[-1][0])
-                    
-                    # Если дошли до старта - выходим
-                    if oldest_ts <= start_ms:
+        while current_end > start_ms:
+            try:
+                params = {
+                    'category': 'linear',
+                    'symbol': symbol,
+                    'interval': interval_str,
+                    'start': str(start_ms),
+                    'end': str(current_end),
+                    'limit': str(KLINE_BATCH_LIMIT),
+                }
+                # Семафор ограничивает число запросов в полете по всем символам
+                async with semaphore:
+                    async with session.get(BYBIT_KLINE_URL, params=params) as resp:
+                        response = orjson.loads(await resp.read())
+                
+                if response['retCode'] != 0:
+                    if "too many requests" in response['retMsg'].lower():
+                        await asyncio.sleep(1)
+                        continue
+                    else:
                         break
-                    
-                    current_end = oldest_ts - 1
-                    time.sleep(0.05)
-                    
-                except Exception as e:
-                    print(f"  ❌ Ошибка {symbol}: {e}")
+                
+                data = response['result']['list']
+                if not data:
                     break
+                
+                all_klines.extend(data)
+                
+                # Берем самую старую свечу в пачке
+                oldest_ts = int(data[-1][0])
+                
+                # Если дошли до старта - выходим
+                if oldest_ts <= start_ms:
+                    break
+                
+                current_end = oldest_ts - 1
+                await asyncio.sleep(0.05)
+                
+            except Exception as e:
+                print(f"  ❌ Ошибка {symbol}: {e}")
+                break
+        
+        return self._klines_to_frame(all_klines, start_ms, end_ms)
+    
+    async def _fetch_many(self, symbols: List[str], interval: str, start_date: str, end_date: str,
+                          max_in_flight: int, pbar: tqdm) -> Dict[str, Optional[pd.DataFrame]]:
+        """Загрузка нескольких символов в одном event loop"""
+        semaphore = asyncio.Semaphore(max_in_flight)
+        
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            async def fetch_one(symbol):
+                try:
+                    return await self._fetch_klines(session, semaphore, symbol, interval, start_date, end_date)
+                except Exception:
+                    return None  # Игнорируем ошибки отдельных символов
+                finally:
+                    pbar.update(1)
+            
+            results = await asyncio.gather(*(fetch_one(symbol) for symbol in symbols))
         
+        return dict(zip(symbols, results))
+    
+    @staticmethod
+    def _date_range_ms(start_date: str, end_date: str):
+        """Границы периода в миллисекундах"""
+        start_ms = int(pd.to_datetime(start_date).timestamp() * 1000)
+        end_ms = int(pd.to_datetime(end_date).timestamp() * 1000)
+        return start_ms, end_ms
+    
+    def _klines_to_frame(self, all_klines: list, start_ms: int, end_ms: int) -> Optional[pd.DataFrame]:
+        """Сырые свечи API (новые->старые, возможны дубли) -> DataFrame за [start_ms, end_ms]"""
         if not all_klines:
             return None
         
-        # Убираем дубликаты и сортируем
-        seen = set()
-        unique_klines = []
-        for k in reversed(all_klines):  # Переворачиваем в старые->новые
-            ts = int(k[0])
-            if ts not in seen and start_ms <= ts <= end_ms:
-                seen.add(ts)
-                unique_klines.append(k)
+        # Строки API -> строковый массив; переворачиваем в старые->новые,
+        # чтобы при дублях, как и раньше, оставалась свеча из пачки, загруженной последней
+        raw = np.asarray(all_klines[::-1])
+        ts = raw[:, 0].astype(np.int64)
         
-        # Конвертируем
-        rows = []
-        for k in unique_klines:
-            ts = int(k[0])
-            dt = datetime.fromtimestamp(ts / 1000)
-            rows.append({
-                'timestamp': dt,
-                'open': float(k[1]),
-                'high': float(k[2]),
-                'low': float(k[3]),
-                'close': float(k[4]),
-                'volume': float(k[5]),
-            })
-        
-        df = pd.DataFrame(rows)
-        df['idx'] = df.index
-        df['returns'] = df['close'].pct_change()
-        df['range_pct'] = (df['high'] - df['low']) / df['low'] * 100
-        df['funding_rate'] = 0.0001
+        # Фильтр по диапазону, дедуп и сортировка - в numba
+        keep = _dedup_sort(ts, start_ms, end_ms)
+        if len(keep) == 0:
+            return None
+        ts = ts[keep]
         
-        print(f"  ✅ {symbol}: {len(df)} свечей")
+        # Разбор строк в числа - в C, без float() на каждое поле
+        ohlcv = raw[keep, 1:6].astype(np.float64)
+        df = self._build_frame(
+            pd.to_datetime(ts, unit='ms'),
+            ohlcv[:, 0], ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], ohlcv[:, 4]
+        )
         return df
 
     
@@ -170,48 +335,19 @@ class BybitDataLoader:
         use_cache: bool = True
     ) -> Optional[pd.DataFrame]:
         """
-        КЭШ: один файл на symbol+interval: cache/{symbol}_{interval}.parquet
+        КЭШ: один файл на symbol+interval: cache/{symbol}_{interval}_v{CACHE_VERSION}.parquet
         - если кэш есть -> читаем и просто фильтруем по датам
         - если кэша нет -> качаем за запрошенный диапазон и сохраняем
         """
 
-        cache_file = self.cache_dir / f"{symbol}_{interval}.parquet"
-
-        # Границы дат
-        start_dt = pd.to_datetime(start_date) if start_date else None
-        end_dt = pd.to_datetime(end_date) if end_date else None
+        cache_file = self._cache_file(symbol, interval)
 
         # 1) Чтение кэша
-        if use_cache and cache_file.exists():
-            try:
-                df = pd.read_parquet(cache_file)
-
-                # Фильтрация по датам (быстро)
-                if start_dt is not None:
-                    df = df[df["timestamp"] >= start_dt]
-                if end_dt is not None:
-                    df = df[df["timestamp"] <= end_dt]
-
+        if use_cache:
+            df = self._read_cache(cache_file, start_date, end_date)
+            if df is not None:
                 # Важно: после фильтра может стать пустым
-                if df is None or len(df) == 0:
-                    return None
-
-                # Если тебе обязательно нужны эти колонки всегда:
-                if "idx" not in df.columns:
-                    df = df.reset_index(drop=True)
-                    df["idx"] = df.index
-                if "returns" not in df.columns:
-                    df["returns"] = df["close"].pct_change()
-                if "range_pct" not in df.columns:
-                    df["range_pct"] = (df["high"] - df["low"]) / df["low"] * 100
-                if "funding_rate" not in df.columns:
-                    df["funding_rate"] = 0.0001
-
-                return df
-
-            except Exception:
-                # если кэш битый -> пробуем скачать заново
-                pass
+                return df if len(df) > 0 else None
 
         # 2) Если кэша нет или он битый -> качаем
         df = self.get_klines(symbol, interval, start_date, end_date)
@@ -220,18 +356,54 @@ class BybitDataLoader:
 
         # 3) Сохраняем в кэш (один файл)
         if use_cache:
-            try:
-                df.to_parquet(cache_file, index=False)
-            except Exception:
-                pass
+            self._write_cache(cache_file, df)
 
         return df
 
+    def _cache_file(self, symbol: str, interval: str) -> Path:
+        return self.cache_dir / f"{symbol}_{interval}_v{CACHE_VERSION}.parquet"
+
+    def _read_cache(self, cache_file: Path, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+        """
+        Кэш, отфильтрованный по датам (может оказаться пустым).
+        None - кэша нет или он битый, надо качать
+        """
+        if not cache_file.exists():
+            return None
+
+        # Границы дат
+        start_dt = pd.to_datetime(start_date) if start_date else None
+        end_dt = pd.to_datetime(end_date) if end_date else None
+
+        try:
+            df = pd.read_parquet(cache_file, engine='pyarrow', columns=CACHE_COLUMNS)
+            ts = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+
+            # Фильтрация по датам: кэш отсортирован по времени -> бинпоиск и срез
+            lo = ts.searchsorted(start_dt.to_datetime64()) if start_dt is not None else 0
+            hi = ts.searchsorted(end_dt.to_datetime64(), side='right') if end_dt is not None else len(ts)
+            return df.iloc[lo:hi]
+
+        except Exception:
+            # если кэш битый -> пробуем скачать заново
+            return None
+
+    def _write_cache(self, cache_file: Path, df: pd.DataFrame):
+        try:
+            # Время всегда пишем как datetime64[ns], чтобы при чтении не было object-колонки
+            df = df[CACHE_COLUMNS].astype({'timestamp': 'datetime64[ns]'})
+            df.to_parquet(cache_file, engine='pyarrow', compression='zstd', index=False)
+        except Exception:
+            pass
+
     
     def prepare_market_data(self, symbols: List[str], interval: str = '15m',
                        start_date: str = None, end_date: str = None,
-                       max_workers: int = 5, use_cache: bool = True) -> Dict[str, pd.DataFrame]:
-        """Параллельная загрузка данных"""
+                       max_workers: int = 20, use_cache: bool = True) -> Dict[str, pd.DataFrame]:
+        """
+        Параллельная загрузка данных: кэш читается сразу,
+        недостающие символы качаются асинхронно, не больше max_workers запросов в полете
+        """
         
         market_data = {}
         total_symbols = len(symbols)
@@ -239,27 +411,36 @@ class BybitDataLoader:
         print(f"\n📥 Загрузка данных для {total_symbols} символов...")
         print(f"   Это займет примерно {total_symbols * 2 // 60} минут...\n")
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_symbol = {
-                executor.submit(
-                    self.load_symbol_data, symbol, interval, start_date, end_date, use_cache
-                ): symbol for symbol in symbols
-            }
+        # Единый прогресс-бар для всех символов
+        with tqdm(total=total_symbols, desc="Общий прогресс", unit=" символ") as pbar:
+            to_fetch = []
+            if use_cache:
+                # Чтение parquet в pyarrow отпускает GIL - файлы кэша читаются внахлест
+                def read_one(symbol):
+                    return self._read_cache(self._cache_file(symbol, interval), start_date, end_date)
+                with ThreadPoolExecutor(max_workers=CACHE_READ_WORKERS) as pool:
+                    cached = list(pool.map(read_one, symbols))
+            else:
+                cached = [None] * total_symbols
             
-            # Единый прогресс-бар для всех символов
-            with tqdm(total=total_symbols, desc="Общий прогресс", unit=" символ") as pbar:
-                for future in as_completed(future_to_symbol):
-                    symbol = future_to_symbol[future]
-                    try:
-                        df = future.result()
-                        if df is not None and len(df) > 0:
-                            market_data[symbol] = df
-                    except Exception as e:
-                        pass  # Игнорируем ошибки отдельных символов
-                    
-                    pbar.update(1)
-                    # Обновляем описание с текущим символом
-                    pbar.set_description(f"Загружено: {len(market_data)}/{total_symbols}")
+            for symbol, df in zip(symbols, cached):
+                if df is None:
+                    to_fetch.append(symbol)
+                    continue
+                if len(df) > 0:
+                    market_data[symbol] = df
+                pbar.update(1)
+            
+            if to_fetch:
+                fetched = asyncio.run(self._fetch_many(to_fetch, interval, start_date, end_date, max_workers, pbar))
+                for symbol, df in fetched.items():
+                    if df is None or len(df) == 0:
+                        continue
+                    if use_cache:
+                        self._write_cache(self._cache_file(symbol, interval), df)
+                    market_data[symbol] = df
+            
+            pbar.set_description(f"Загружено: {len(market_data)}/{total_symbols}")
         
         print(f"\n✅ Загружено {len(market_data)} символов из {total_symbols}")
-        return market_data
\ No newline at end of file
+        return market_data
@@ -45,9 +45,9 @@ def main():
     parser.add_argument('--symbols', type=str, nargs='+',
                        help='Specific symbols to test')
     parser.add_argument('--parallel', action='store_true',
-                       help='Use multiprocessing for backtest')
-    parser.add_argument('--workers', type=int, default=5,
-                       help='Number of threads for data loading')
+                       help='Run all symbols in one process via numba prange')
+    parser.add_argument('--workers', type=int, default=20,
+                       help='Max concurrent API requests for data loading')
     parser.add_argument('--no-cache', action='store_true',
                        help='Disable data caching')
     parser.add_argument('--max-symbols', type=int, default=None,
@@ -159,14 +159,15 @@ def main():
     
     # Анализ результатов
     print("\n📊 Analyzing results...", flush=True)
+    equity_history = backtester.portfolio.equity_history
     analyzer = MetricsAnalyzer()
     metrics = analyzer.calculate_all_metrics(
         backtester.portfolio.trades,
-        backtester.portfolio.equity_history,
+        equity_history,
         backtester.portfolio.initial_capital
     )
     
-    metrics['equity_history'] = backtester.portfolio.equity_history
+    metrics['equity_history'] = equity_history
     metrics['initial_capital'] = backtester.portfolio.initial_capital
     
     # Сохранение
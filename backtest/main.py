@@ -13,7 +13,7 @@ print("=" * 70)
 
 try:
     from config import StrategyConfig
-    from backtester import Backtester
+    from backtester import Backtester, _warmup_numba
     from data_loader import BybitDataLoader
     from analyzers.metrics import MetricsAnalyzer
     print("✅ Импорты успешны")
@@ -28,11 +28,13 @@ def main():
     parser.add_argument('--pump', type=float, default=0.40)
     parser.add_argument('--tp', type=float, default=0.30)
     parser.add_argument('--stall', type=int, default=3)
-    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=20)
     parser.add_argument('--no-cache', action='store_true')
     parser.add_argument('--sl-multiplier', type=float, default=2.0)
     parser.add_argument('--no-prints', action='store_true')
     parser.add_argument('--out', type=str, default='backtest_results')
+    parser.add_argument('--specialize', action='store_true',
+                        help='Компилировать ядро под текущие параметры (~1с, быстрее на длинных прогонах)')
     
     args = parser.parse_args()
     print(f"📋 Аргументы: {args}")
@@ -81,7 +83,8 @@ def main():
     print(f"\n✅ Загружено {len(market_data)} символов")
     
     print("\n⚙️ Запуск бэктеста...")
-    backtester = Backtester(config)
+    backtester = Backtester(config, specialize=args.specialize)
+    _warmup_numba()
     start_time = datetime.now()
     
     all_trades = backtester.run_multiprocess(market_data)
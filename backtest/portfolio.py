@@ -4,6 +4,17 @@ import numpy as np
 from models import Trade
 from config import StrategyConfig
 
+# Снимок equity curve - одна запись структурного массива вместо dict на снимок
+SNAPSHOT_DTYPE = np.dtype([
+    ('timestamp', 'M8[ns]'),
+    ('idx', np.int64),
+    ('equity', np.float64),
+    ('cash', np.float64),
+    ('open_positions_value', np.float64),
+    ('open_positions_count', np.int64),
+    ('drawdown', np.float64),
+])
+
 class Portfolio:
     """Управление капиталом и позициями"""
     
@@ -14,8 +25,10 @@ class Portfolio:
         self.peak_capital = config.initial_capital
         self.trades: List[Trade] = []
         
-        # Для equity curve
-        self.equity_history: List[dict] = []
+        # Для equity curve: заполненная часть - self._snapshots[:self._n_snapshots]
+        self._snapshots = np.empty(1024, dtype=SNAPSHOT_DTYPE)
+        self._n_snapshots = 0
+        self._equity_history: Optional[List[dict]] = None  # собирается при первом чтении
         
     def can_open_position(self) -> bool:
         """Проверка лимита позиций и достаточности капитала"""
@@ -30,6 +43,10 @@ class Portfolio:
         self.current_capital += trade.pnl_usdt
         self.peak_capital = max(self.peak_capital, self.current_capital)
     
+    def _open_trades(self) -> List[Trade]:
+        """Открытые сделки (без exit_time)"""
+        return [t for t in self.trades if t.exit_time is None]
+    
     def get_total_equity(self, current_prices: Dict[str, float] = None) -> float:
         """
         Расчет общей стоимости портфеля с учетом открытых позиций
@@ -39,76 +56,124 @@ class Portfolio:
         """
         total = self.current_capital
         
-        for trade in self.trades:
-            if trade.exit_time is None:  # Открытая позиция
-                if current_prices and trade.symbol in current_prices:
-                    # Реальная цена
-                    current_price = current_prices[trade.symbol]
-                    unrealized = (trade.entry_price - current_price) / trade.entry_price * self.config.trade_size_usdt
-                    total += unrealized
-                else:
-                    # Если нет текущей цены, используем последнюю известную
-                    unrealized = trade.pnl_usdt if trade.pnl_usdt else 0
-                    total += unrealized
+        for trade in self._open_trades():
+            if current_prices and trade.symbol in current_prices:
+                # Реальная цена
+                current_price = current_prices[trade.symbol]
+                unrealized = (trade.entry_price - current_price) / trade.entry_price * self.config.trade_size_usdt
+                total += unrealized
+            else:
+                # Если нет текущей цены, используем последнюю известную
+                unrealized = trade.pnl_usdt if trade.pnl_usdt else 0
+                total += unrealized
         
         return total
     
     def get_open_positions_value(self) -> float:
         """Суммарная стоимость открытых позиций"""
-        return len([t for t in self.trades if t.exit_time is None]) * self.config.trade_size_usdt
+        return len(self._open_trades()) * self.config.trade_size_usdt
+    
+    def _reserve_snapshots(self, extra: int):
+        """Гарантировать место под extra снимков (емкость удваивается)"""
+        need = self._n_snapshots + extra
+        if need <= len(self._snapshots):
+            return
+        grown = np.empty(max(need, 2 * len(self._snapshots)), dtype=SNAPSHOT_DTYPE)
+        grown[:self._n_snapshots] = self._snapshots[:self._n_snapshots]
+        self._snapshots = grown
     
     def record_snapshot(self, timestamp, idx: int, current_prices: Dict[str, float] = None):
         """Запись состояния портфеля для equity curve"""
         total_equity = self.get_total_equity(current_prices)
+        open_trades = self._open_trades()
         
-        self.equity_history.append({
-            'timestamp': timestamp,
-            'idx': idx,
-            'equity': total_equity,
-            'cash': self.current_capital,
-            'open_positions_value': self.get_open_positions_value(),
-            'open_positions_count': len([t for t in self.trades if t.exit_time is None]),
-            'drawdown': (self.peak_capital - total_equity) / self.peak_capital * 100 if self.peak_capital > 0 else 0
-        })
+        self._reserve_snapshots(1)
+        self._snapshots[self._n_snapshots] = (
+            timestamp,
+            idx,
+            total_equity,
+            self.current_capital,
+            len(open_trades) * self.config.trade_size_usdt,
+            len(open_trades),
+            (self.peak_capital - total_equity) / self.peak_capital * 100 if self.peak_capital > 0 else 0,
+        )
+        self._n_snapshots += 1
+        self._equity_history = None
         
         self.peak_capital = max(self.peak_capital, total_equity)
+    
+    def extend_snapshots(self, **columns: np.ndarray):
+        """Дописать пачку снимков колонками (имена полей SNAPSHOT_DTYPE), например из буфера ядра"""
+        n = len(columns['idx'])
+        self._reserve_snapshots(n)
+        block = self._snapshots[self._n_snapshots:self._n_snapshots + n]
+        for name in SNAPSHOT_DTYPE.names:
+            block[name] = columns[name]
+        self._n_snapshots += n
+        self._equity_history = None
+    
+    @property
+    def snapshots(self) -> np.ndarray:
+        """Записанные снимки (view, без копирования)"""
+        return self._snapshots[:self._n_snapshots]
+    
+    @property
+    def equity_history(self) -> List[dict]:
+        """Снимки в виде списка dict - для MetricsAnalyzer и экспорта (собирается один раз до нового снимка)"""
+        if self._equity_history is None:
+            snaps = self.snapshots
+            # numpy.datetime64, как раньше (df["timestamp"].values[idx]); tolist() дал бы int наносекунд
+            timestamps = list(snaps['timestamp'])
+            columns = [snaps[name].tolist() for name in SNAPSHOT_DTYPE.names[1:]]
+            self._equity_history = [
+                {'timestamp': ts, **dict(zip(SNAPSHOT_DTYPE.names[1:], row))}
+                for ts, row in zip(timestamps, zip(*columns))
+            ]
+        return self._equity_history
         
     def get_metrics(self) -> dict:
         """Расчет агрегированных метрик портфеля"""
-        closed_trades = [t for t in self.trades if t.exit_time is not None]
-        open_trades = [t for t in self.trades if t.exit_time is None]
-        
-        if not closed_trades and not open_trades:
+        n = len(self.trades)
+        if n == 0:
             return {}
         
+        # Один проход по сделкам в массивы, дальше только векторные редукции
+        closed = np.fromiter((t.exit_time is not None for t in self.trades), dtype=bool, count=n)
+        pnl = np.fromiter((t.pnl_usdt or 0.0 for t in self.trades), dtype=np.float64, count=n)
+        closed_pnl = pnl[closed]
+        n_closed = len(closed_pnl)
+        
         # Считаем реализованную прибыль
-        realized_profits = [t.pnl_usdt for t in closed_trades if t.pnl_usdt > 0]
-        realized_losses = [t.pnl_usdt for t in closed_trades if t.pnl_usdt <= 0]
+        is_win = closed_pnl > 0
+        realized_profits = closed_pnl[is_win]
+        realized_losses = closed_pnl[~is_win]
         
         # Считаем нереализованную прибыль (если есть текущие цены)
-        unrealized_pnl = sum(t.pnl_usdt for t in open_trades if t.pnl_usdt) if open_trades else 0
+        unrealized_pnl = float(pnl[~closed].sum())
         
-        total_pnl = sum(t.pnl_usdt for t in closed_trades) + unrealized_pnl
-        win_trades = len([t for t in closed_trades if t.pnl_usdt > 0])
-        loss_trades = len([t for t in closed_trades if t.pnl_usdt <= 0])
+        realized_pnl = float(closed_pnl.sum())
+        total_pnl = realized_pnl + unrealized_pnl
+        win_trades = len(realized_profits)
+        loss_trades = len(realized_losses)
+        losses_sum = realized_losses.sum()
         
         metrics = {
-            'total_trades': len(closed_trades),
-            'open_trades': len(open_trades),
+            'total_trades': n_closed,
+            'open_trades': n - n_closed,
             'win_trades': win_trades,
             'loss_trades': loss_trades,
-            'win_rate': win_trades / len(closed_trades) * 100 if closed_trades else 0,
+            'win_rate': win_trades / n_closed * 100 if n_closed else 0,
             'total_pnl_usdt': total_pnl,
-            'realized_pnl_usdt': sum(t.pnl_usdt for t in closed_trades),
+            'realized_pnl_usdt': realized_pnl,
             'unrealized_pnl_usdt': unrealized_pnl,
             'total_pnl_percent': (total_pnl / self.initial_capital) * 100,
-            'avg_win': np.mean(realized_profits) if realized_profits else 0,
-            'avg_loss': np.mean(realized_losses) if realized_losses else 0,
-            'profit_factor': abs(sum(realized_profits) / sum(realized_losses)) if realized_losses and sum(realized_losses) != 0 else float('inf'),
-            'max_drawdown': max([e['drawdown'] for e in self.equity_history]) if self.equity_history else 0,
+            'avg_win': realized_profits.mean() if win_trades else 0,
+            'avg_loss': realized_losses.mean() if loss_trades else 0,
+            'profit_factor': abs(realized_profits.sum() / losses_sum) if loss_trades and losses_sum != 0 else float('inf'),
+            'max_drawdown': self.snapshots['drawdown'].max() if self._n_snapshots else 0,
             'final_capital': self.current_capital + unrealized_pnl,
             'final_cash': self.current_capital,
-            'expectancy': np.mean([t.pnl_usdt for t in closed_trades]) if closed_trades else 0,
+            'expectancy': closed_pnl.mean() if n_closed else 0,
         }
         
         return metrics
\ No newline at end of file
@@ -24,6 +24,10 @@ class PositionManager:
     def open_position(self, trade: Trade, df: pd.DataFrame, idx: int) -> Tuple[bool, Optional[str]]:
         """Открытие позиции."""
         candle = df.iloc[idx]
+        high = candle["high"]
+        low = candle["low"]
+        sl_price = float(trade.sl_price)
+        tp_price = float(trade.tp_price)
 
         # Устанавливаем размер позиции через риск-менеджер
         trade.position_size = self.get_position_size(trade.symbol)
@@ -32,9 +36,10 @@ class PositionManager:
         trade.entry_fee = trade.position_size * self.config.taker_fee
 
         # SL для шорта
-        if float(candle["high"]) >= float(trade.sl_price):
-            exit_price = float(trade.sl_price) * (1 + self.config.slippage)
-            print(f"🔴 SL НА ВХОДЕ {trade.symbol}: high={float(candle['high']):.4f} >= sl={float(trade.sl_price):.4f}")
+        if high >= sl_price:
+            exit_price = sl_price * (1 + self.config.slippage)
+            if not self.config.no_prints:
+                print(f"🔴 SL НА ВХОДЕ {trade.symbol}: high={high:.4f} >= sl={sl_price:.4f}")
             self.close_position(trade.symbol, idx, exit_price, "sl", candle, df)
             
             # Обновляем риск-менеджер после убытка
@@ -46,9 +51,10 @@ class PositionManager:
             return False, "sl_immediate"
 
         # TP для шорта
-        if float(candle["low"]) <= float(trade.tp_price):
-            exit_price = float(trade.tp_price) * (1 + self.config.slippage)
-            print(f"🟢 TP НА ВХОДЕ {trade.symbol}: low={float(candle['low']):.4f} <= tp={float(trade.tp_price):.4f}")
+        if low <= tp_price:
+            exit_price = tp_price * (1 + self.config.slippage)
+            if not self.config.no_prints:
+                print(f"🟢 TP НА ВХОДЕ {trade.symbol}: low={low:.4f} <= tp={tp_price:.4f}")
             self.close_position(trade.symbol, idx, exit_price, "tp", candle, df)
             
             # Обновляем риск-менеджер после прибыли
@@ -65,14 +71,19 @@ class PositionManager:
     def check_positions(self, df: pd.DataFrame, idx: int) -> Dict[str, str]:
         """Проверка всех открытых позиций на TP/SL"""
         closed: Dict[str, str] = {}
+        if not self.positions:
+            return closed
         candle = df.iloc[idx]
+        high = candle["high"]
+        low = candle["low"]
 
         for symbol in list(self.positions.keys()):
             trade = self.positions[symbol]
 
             # SL для шорта
-            if float(candle["high"]) >= float(trade.sl_price):
-                print(f"🔴 SL {symbol}: high={float(candle['high']):.4f} >= sl={float(trade.sl_price):.4f}")
+            if high >= trade.sl_price:
+                if not self.config.no_prints:
+                    print(f"🔴 SL {symbol}: high={high:.4f} >= sl={float(trade.sl_price):.4f}")
                 exit_price = float(trade.sl_price) * (1 + self.config.slippage)
                 self.close_position(symbol, idx, exit_price, "sl", candle, df)
                 
@@ -86,8 +97,9 @@ class PositionManager:
                 continue
 
             # TP для шорта
-            if float(candle["low"]) <= float(trade.tp_price):
-                print(f"🟢 TP {symbol}: low={float(candle['low']):.4f} <= tp={float(trade.tp_price):.4f}")
+            if low <= trade.tp_price:
+                if not self.config.no_prints:
+                    print(f"🟢 TP {symbol}: low={low:.4f} <= tp={float(trade.tp_price):.4f}")
                 exit_price = float(trade.tp_price) * (1 + self.config.slippage)
                 self.close_position(symbol, idx, exit_price, "tp", candle, df)
                 
@@ -98,7 +110,6 @@ class PositionManager:
                     symbol=trade.symbol
                 )
                 closed[symbol] = "tp"
-                continue
 
         return closed
 
@@ -109,10 +120,12 @@ class PositionManager:
             return closed_trades
 
         candle = df.iloc[idx]
-        print(f"⏰ Принудительное закрытие {len(self.positions)} позиций: {reason}")
+        close = candle["close"]
+        if not self.config.no_prints:
+            print(f"⏰ Принудительное закрытие {len(self.positions)} позиций: {reason}")
 
         for symbol in list(self.positions.keys()):
-            exit_price = float(candle["close"]) * (1 + self.config.slippage)
+            exit_price = close * (1 + self.config.slippage)
             trade = self.positions.get(symbol)
             if trade is None:
                 continue
@@ -140,35 +153,37 @@ class PositionManager:
         # Выход
         trade.exit_time = candle["timestamp"]
         trade.exit_idx = idx
-        trade.exit_price = float(exit_price)
+        trade.exit_price = exit_price
         trade.exit_reason = reason
         trade.slippage_exit = self.config.slippage
 
         # Комиссии (используем trade.position_size)
-        if not hasattr(trade, 'position_size') or not trade.position_size:
+        # entry_fee уже посчитан в open_position от того же position_size
+        if not trade.position_size:
             trade.position_size = self.config.trade_size_usdt
+            trade.entry_fee = trade.position_size * self.config.taker_fee
             
-        trade.entry_fee = trade.position_size * self.config.taker_fee
-        trade.exit_fee = trade.position_size * self.config.taker_fee
+        trade.exit_fee = trade.entry_fee
         trade.fees_total = trade.entry_fee + trade.exit_fee
         trade.slippage_total = (trade.slippage_entry or 0) + (trade.slippage_exit or 0)
 
         # PnL (используем trade.position_size)
-        price_diff = float(trade.entry_price) - float(trade.exit_price)
-        trade.pnl_usdt = (price_diff / float(trade.entry_price)) * trade.position_size
+        entry_price = trade.entry_price
+        trade.pnl_usdt = ((entry_price - exit_price) / entry_price) * trade.position_size
         trade.pnl_usdt -= trade.fees_total
         trade.pnl_usdt -= trade.slippage_total
 
         trade.pnl_percent = (trade.pnl_usdt / trade.position_size) * 100.0
 
         # Длительность
-        trade.duration_bars = idx - int(trade.entry_idx)
-        trade.duration_minutes = int(trade.duration_bars) * 15
+        trade.duration_bars = idx - trade.entry_idx
+        trade.duration_minutes = trade.duration_bars * 15
 
         # MFE/MAE
         trade.calculate_metrics(df)
 
-        print(f"💰 {symbol} {reason}: PnL={trade.pnl_usdt:.2f} USDT ({trade.pnl_percent:.1f}%) | Размер: ${trade.position_size:.2f}")
+        if not self.config.no_prints:
+            print(f"💰 {symbol} {reason}: PnL={trade.pnl_usdt:.2f} USDT ({trade.pnl_percent:.1f}%) | Размер: ${trade.position_size:.2f}")
 
         # Удаляем из активных
         del self.positions[symbol]
\ No newline at end of file
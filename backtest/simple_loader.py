@@ -3,12 +3,26 @@
 Упрощенный загрузчик данных из Bybit
 """
 
+import aiohttp
+import asyncio
+import orjson
 import requests
+import time
 from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
 import pandas as pd
-import time
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
+KLINE_URL = "https://api.bybit.com/v5/market/kline"
+MAX_IN_FLIGHT = 10  # одновременных запросов к Bybit
+
+# Несжатый parquet: при чтении файл отображается в память, без разбора JSON
+CACHE_DIR = Path('simple_cache')
+CACHE_TTL = 15 * 60  # данные "за последние N дней" устаревают с новой свечой
+
 def get_symbols(limit=10):
     """Получение списка символов"""
     url = "https://api.bybit.com/v5/market/instruments-info"
@@ -34,14 +48,11 @@ def get_symbols(limit=10):
         print(f"Error: {e}")
         return []
 
-def fetch_klines_simple(symbol, days=30):
-    """Простая загрузка свечей"""
-    url = "https://api.bybit.com/v5/market/kline"
-    
+def _klines_params(symbol, days):
     end_time = datetime.now()
     start_time = end_time - timedelta(days=days)
     
-    params = {
+    return {
         'category': 'linear',
         'symbol': symbol,
         'interval': '15',
@@ -49,38 +60,101 @@ def fetch_klines_simple(symbol, days=30):
         'end': int(end_time.timestamp() * 1000),
         'limit': 200
     }
+
+def _klines_frame(klines):
+    """Ответ kline -> DataFrame: по отдельному contiguous float64-массиву на колонку"""
+    n = len(klines)
+    ts_ms = np.empty(n, dtype=np.int64)
+    ohlcv = {c: np.empty(n, dtype=np.float64) for c in ('open', 'high', 'low', 'close', 'volume')}
+    for i, k in enumerate(klines):
+        ts_ms[i] = int(k[0])
+        ohlcv['open'][i] = float(k[1])
+        ohlcv['high'][i] = float(k[2])
+        ohlcv['low'][i] = float(k[3])
+        ohlcv['close'][i] = float(k[4])
+        ohlcv['volume'][i] = float(k[5])
     
+    # Bybit отдает свечи от новых к старым
+    order = np.argsort(ts_ms, kind='stable')
+    return pd.DataFrame({
+        'timestamp': [datetime.fromtimestamp(t / 1000) for t in ts_ms[order]],
+        **{c: arr[order] for c, arr in ohlcv.items()},
+    })
+
+def _parse_klines(data):
+    if data['retCode'] == 0:
+        klines = data['result']['list']
+        print(f"  Got {len(klines)} candles")
+        # Пустой ответ - None, как раньше: иначе пустой кадр попал бы в кэш на весь CACHE_TTL
+        if not klines:
+            return None
+        return _klines_frame(klines)
+    else:
+        print(f"  Error: {data.get('retMsg', 'Unknown')}")
+        return None
+
+def fetch_klines_simple(symbol, days=30):
+    """Простая загрузка свечей"""
     try:
         print(f"Fetching {symbol}...")
-        response = requests.get(url, params=params, timeout=30)
-        data = response.json()
-        
-        if data['retCode'] == 0:
-            klines = data['result']['list']
-            print(f"  Got {len(klines)} candles")
-            
-            # Конвертируем в DataFrame
-            rows = []
-            for k in klines:
-                rows.append({
-                    'timestamp': datetime.fromtimestamp(int(k[0]) / 1000),
-                    'open': float(k[1]),
-                    'high': float(k[2]),
-                    'low': float(k[3]),
-                    'close': float(k[4]),
-                    'volume': float(k[5])
-                })
-            
-            df = pd.DataFrame(rows)
-            df = df.sort_values('timestamp')
-            return df
-        else:
-            print(f"  Error: {data.get('retMsg', 'Unknown')}")
-            return None
+        response = requests.get(KLINE_URL, params=_klines_params(symbol, days), timeout=30)
+        return _parse_klines(response.json())
     except Exception as e:
         print(f"  Error: {e}")
         return None
 
+async def fetch_klines_async(session, semaphore, symbol, days=30):
+    """То же, что fetch_klines_simple, но в общей aiohttp-сессии; semaphore ограничивает запросы в полете"""
+    try:
+        async with semaphore:
+            print(f"Fetching {symbol}...")
+            async with session.get(KLINE_URL, params=_klines_params(symbol, days)) as response:
+                data = orjson.loads(await response.read())
+        return _parse_klines(data)
+    except Exception as e:
+        print(f"  Error: {e}")
+        return None
+
+def _cache_path(symbol, days):
+    return CACHE_DIR / f"{symbol}_15m_{days}d.parquet"
+
+def read_cache(symbol, days=30):
+    """Свежий кэш символа или None"""
+    path = _cache_path(symbol, days)
+    try:
+        if time.time() - path.stat().st_mtime > CACHE_TTL:
+            return None
+        return pq.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+    except (OSError, pa.ArrowException):
+        return None
+
+def write_cache(symbol, df, days=30):
+    """Атомарная запись: пишем во временный файл и подменяем"""
+    CACHE_DIR.mkdir(exist_ok=True)
+    path = _cache_path(symbol, days)
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression='none')
+        tmp_path.replace(path)
+    except OSError as e:
+        print(f"  Cache write error {symbol}: {e}")
+
+async def fetch_all(symbols, days=30, max_in_flight=MAX_IN_FLIGHT, use_cache=True):
+    """Загрузка всех символов одновременно: symbol -> DataFrame или None (свежий кэш не качается)"""
+    frames = {s: read_cache(s, days) for s in symbols} if use_cache else dict.fromkeys(symbols)
+    to_fetch = [s for s, df in frames.items() if df is None]
+    
+    if to_fetch:
+        semaphore = asyncio.Semaphore(max_in_flight)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            fetched = await asyncio.gather(*(fetch_klines_async(session, semaphore, s, days) for s in to_fetch))
+        for symbol, df in zip(to_fetch, fetched):
+            if use_cache and df is not None:
+                write_cache(symbol, df, days)
+            frames[symbol] = df
+    
+    return frames
+
 def main():
     print("Simple Bybit Data Loader Test")
     print("=" * 50)
@@ -96,11 +170,10 @@ def main():
     
     # Загружаем данные
     print("\n2. Loading data...")
-    for symbol in symbols:
-        df = fetch_klines_simple(symbol, days=30)
+    frames = asyncio.run(fetch_all(symbols, days=30))
+    for symbol, df in frames.items():
         if df is not None:
             print(f"   {symbol}: {len(df)} candles, from {df['timestamp'].min()} to {df['timestamp'].max()}")
-        time.sleep(1)  # Пауза между запросами
     
     print("\n✅ Test complete")
 
@@ -4,7 +4,7 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from models import WatchlistItem, Trade
 from config import StrategyConfig
-import uuid
+import itertools
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +15,8 @@ class StrategyEngine:
     def __init__(self, config: StrategyConfig):
         self.config = config
         self.watchlist: Dict[str, WatchlistItem] = {}
+        # Номер сделки для trade_id: детерминирован между запусками, в отличие от uuid4
+        self._trade_seq = itertools.count()
         
     def scan_for_pumps(self, symbol: str, df: pd.DataFrame, current_idx: int) -> Optional[WatchlistItem]:
         """
@@ -62,24 +64,27 @@ class StrategyEngine:
         """
         ready_for_entry = []
         
+        # Проверка на таймаут (24 часа)
         for symbol in list(self.watchlist.keys()):
-            item = self.watchlist[symbol]
-            
-            # Проверка на таймаут (24 часа)
-            if current_idx - item.added_time_idx >= self.config.watchlist_timeout:
+            if current_idx - self.watchlist[symbol].added_time_idx >= self.config.watchlist_timeout:
                 if not self.config.no_prints:
                     print(f"  ⏰ {symbol}: Таймаут watchlist")
                 del self.watchlist[symbol]
-                continue
-            
-            # Текущая свеча
-            current_candle = df.iloc[current_idx]
-            
+        
+        # В watchlist только живые элементы - на пустом баре делать нечего
+        if not self.watchlist:
+            return ready_for_entry
+        
+        # Текущая свеча
+        current_high = df.iloc[current_idx]['high']
+        
+        # Цикл не меняет словарь - итерируемся без копии ключей
+        for symbol, item in self.watchlist.items():
             # Обновление localHigh
-            if current_candle['high'] > item.local_high:
+            if current_high > item.local_high:
                 if not self.config.no_prints:
-                    print(f"  📈 {symbol}: Обновление high {item.local_high:.4f} -> {current_candle['high']:.4f}")
-                item.local_high = current_candle['high']
+                    print(f"  📈 {symbol}: Обновление high {item.local_high:.4f} -> {current_high:.4f}")
+                item.local_high = current_high
                 item.local_high_idx = current_idx
                 item.last_high_update_idx = current_idx
                 item.stall_counter = 0
@@ -108,25 +113,26 @@ class StrategyEngine:
             return None
         
         current_candle = df.iloc[current_idx]
+        current_close = current_candle['close']
         
         # Расчет TP от localHigh
         tp_price = item.local_high * (1 - self.config.tp_percent)
         
         # Проверка: не входить если цена уже ниже TP
-        if current_candle['close'] <= tp_price:
+        if current_close <= tp_price:
             if not self.config.no_prints:
                 print(f"  ⏭️ {item.symbol}: Пропуск - цена уже ниже TP")
             return None
         
         # SL = entry * 2
-        entry_price = current_candle['close'] * (1 + self.config.slippage)
+        entry_price = current_close * (1 + self.config.slippage)
         sl_price = entry_price * self.config.sl_multiplier
         if not self.config.no_prints:
             print(f"  ✅ {item.symbol}: Условия выполнены, вход по {entry_price:.4f}")
         
         trade = Trade(
             symbol=item.symbol,
-            trade_id=f"{item.symbol}_{current_idx}_{uuid.uuid4().hex[:8]}",
+            trade_id=f"{item.symbol}_{current_idx}_{next(self._trade_seq):08x}",
             entry_time=current_candle['timestamp'],
             entry_idx=current_idx,
             entry_price=entry_price,
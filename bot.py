@@ -8,13 +8,19 @@ Bybit Short Strategy Bot
 import os
 import sys
 import time
+import queue
+import atexit
 import json
 import logging
+import logging.handlers
 import signal
-import math
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Dict, Any, Optional, List, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
 
 # Загружаем .env
@@ -23,22 +29,35 @@ load_dotenv()
 # Создаем папку для логов
 os.makedirs('data/logs', exist_ok=True)
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('data/logs/bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Настройка логирования: запись в файл/консоль - в потоке QueueListener, торговый цикл только кладет запись в очередь
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.FileHandler('data/logs/bot.log'), logging.StreamHandler()]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # иначе basicConfig добавит свой префикс к тексту записи
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
+# Длительность свечи (timeframe "15")
+_BAR_SECONDS = 15 * 60
+# Фильтры инструментов (шаг цены/количества) меняются редко - перечитываем раз в сутки
+_FILTERS_TTL = 24 * 3600
+
 # Импорты наших модулей
 from config import BotConfig
 from live.bybit_client import BybitClient
+from live.fast_filter import pump_mask, warmup as warmup_pump_mask
+from live.kline_stream import KlineStream, Candle
+from live.ticker_stream import TickerStream
 from live.order_manager import OrderManager
 from live.position_tracker import PositionTracker
+from live.wallet_stream import WalletStream
+from live.position_stream import PositionStream
 from live.telegram_notifier import TelegramNotifier
 
 # =====================================
@@ -50,6 +69,13 @@ from live.risk_manager import RiskManager
 # (the imported class already tracks trades_history, daily limits, etc.)
 
 
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
 # =====================================
 # ОСНОВНОЙ БОТ
 # =====================================
@@ -57,12 +83,36 @@ class ShortBot:
     def __init__(self):
         self.config = BotConfig()
         self.running = True
+        self._wakeup = threading.Event()  # будит основной цикл: остановка или закрытие позиции на бирже
 
+        testnet = os.getenv("BYBIT_TESTNET", "false").lower() == "true"
         self.client = BybitClient(
             api_key=os.getenv("BYBIT_API_KEY"),
             api_secret=os.getenv("BYBIT_API_SECRET"),
-            testnet=os.getenv("BYBIT_TESTNET", "false").lower() == "true"
+            testnet=testnet,
+            use_ws_trade_api=self.config.use_ws_trade_api
         )
+        self.klines = KlineStream(interval=self.config.timeframe, testnet=testnet)
+        self.tickers_ws = TickerStream(testnet=testnet)  # цены watchlist и позиций
+        try:
+            self.wallet: Optional[WalletStream] = WalletStream(
+                api_key=os.getenv("BYBIT_API_KEY"),
+                api_secret=os.getenv("BYBIT_API_SECRET"),
+                testnet=testnet
+            )
+        except Exception as e:
+            logger.error(f"WebSocket кошелька недоступен, баланс через REST: {e}")
+            self.wallet = None
+        try:
+            self.positions_ws: Optional[PositionStream] = PositionStream(
+                api_key=os.getenv("BYBIT_API_KEY"),
+                api_secret=os.getenv("BYBIT_API_SECRET"),
+                testnet=testnet,
+                on_close=self._wakeup.set
+            )
+        except Exception as e:
+            logger.error(f"WebSocket позиций недоступен, закрытия проверяются раз в свечу: {e}")
+            self.positions_ws = None
 
         self.initial_balance = self.get_balance()
         self.risk_manager = RiskManager(initial_capital=self.initial_balance)
@@ -73,7 +123,12 @@ class ShortBot:
         )
 
         self.last_bar_close = 0
-        self._last_stall_check = 0
+        self._io_pool = ThreadPoolExecutor(max_workers=2)  # параллельные REST-запросы в начале свечи
+        self._tickers_cache: Dict[str, Dict[str, Any]] = {}
+        self._tickers_cache_ts: float = 0
+        self._filters_cache: Dict[str, Dict[str, float]] = {}
+        self._filters_cache_ts: float = time.monotonic()
+        warmup_pump_mask()
 
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
@@ -85,6 +140,9 @@ class ShortBot:
         logger.info("=" * 60)
 
     def get_balance(self) -> float:
+        # Последний баланс из WebSocket; REST - пока пушей не было
+        if self.wallet is not None and self.wallet.balance is not None:
+            return self.wallet.balance
         try:
             response = self.client.get_wallet_balance(accountType="UNIFIED", coin="USDT")
             if response.get("retCode") == 0:
@@ -96,166 +154,229 @@ class ShortBot:
     def signal_handler(self, signum, frame):
         logger.info("Получен сигнал остановки, завершаем работу...")
         self.running = False
-
-    def get_current_bar_close(self) -> int:
-        now = int(time.time())
-        return (now // (15 * 60)) * (15 * 60)
-
-    def get_all_tickers(self) -> List[Dict[str, Any]]:
+        self._wakeup.set()
+
+    @staticmethod
+    def get_current_bar_close() -> int:
+        return int(time.time()) // _BAR_SECONDS * _BAR_SECONDS
+
+    def seconds_to_next_wake(self) -> float:
+        """
+        До закрытия текущей свечи + wake_seconds (подтвержденная свеча успевает прийти по WebSocket)
+        или до 00:05 для суточной статистики - что раньше
+        """
+        next_bar = self.get_current_bar_close() + _BAR_SECONDS + self.config.wake_seconds
+        now = datetime.now()
+        report = now.replace(hour=0, minute=5, second=0, microsecond=0)
+        if report <= now:
+            report += timedelta(days=1)
+        return max(0.1, min(next_bar - time.time(), (report - now).total_seconds()))
+
+    def get_tickers_map(self, max_age: float = 1.0) -> Dict[str, Dict[str, Any]]:
+        """Тикеры symbol -> ticker; снимок моложе max_age секунд берется из кэша без запроса"""
+        if time.monotonic() - self._tickers_cache_ts < max_age:
+            return self._tickers_cache
         try:
             response = self.client.get_tickers()
-            return response["result"]["list"]
         except Exception as e:
             logger.error(f"Ошибка получения тикеров: {e}")
-            return []
-
-    def get_klines(self, symbol: str, max_retries: int = 3) -> Optional[List]:
-        for attempt in range(max_retries):
+            return {}
+        self._tickers_cache = {t["symbol"]: t for t in response["result"]["list"]}
+        self._tickers_cache_ts = time.monotonic()
+        return self._tickers_cache
+
+    def get_last_price(self, symbol: str) -> Optional[float]:
+        """
+        Последняя цена символа: из WebSocket тикеров (watchlist и позиции),
+        иначе из свежего снимка тикеров, иначе запросом одного тикера
+        """
+        price = self.tickers_ws.last_price(symbol)
+        if price is not None:
+            return price
+        if time.monotonic() - self._tickers_cache_ts < 1.0:
+            ticker = self._tickers_cache.get(symbol)
+        else:
             try:
-                time.sleep(0.2)
-                response = self.client.get_klines(
-                    symbol=symbol,
-                    interval="15",
-                    limit=5
-                )
-                if response.get("retCode") == 10006:
-                    wait_time = (attempt + 1) * 2
-                    logger.warning(f"Rate limit для {symbol}, ждем {wait_time}с")
-                    time.sleep(wait_time)
-                    continue
-                if response.get("retCode") != 0:
-                    logger.error(f"Ошибка API для {symbol}: {response.get('retMsg')}")
-                    return None
-                return response["result"]["list"]
+                tickers = self.client.get_tickers(symbol=symbol)["result"]["list"]
             except Exception as e:
-                if attempt == max_retries - 1:
-                    logger.error(f"Не удалось получить свечи для {symbol}: {e}")
-                    return None
-                time.sleep((attempt + 1) * 2)
-        return None
-
-    def check_pump_candidate(self, ticker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        symbol = ticker.get("symbol", "")
-        if not symbol.endswith("USDT"):
-            return None
-        try:
-            last = float(ticker.get("lastPrice", 0))
-            high24 = float(ticker.get("highPrice24h", 0))
-            low24 = float(ticker.get("lowPrice24h", 0))
-            turnover = float(ticker.get("turnover24h", 0))
-            if last <= 0 or high24 <= 0 or low24 <= 0:
-                return None
-            pump_pct = (last - low24) / low24
-            near_high = last / high24
-            if turnover < self.config.min_turnover_usdt:
+                logger.error(f"Ошибка получения тикера {symbol}: {e}")
                 return None
-            if pump_pct < self.config.pump_threshold:
-                return None
-            if near_high < self.config.near_high_ratio:
-                return None
-            return {
-                "symbol": symbol,
-                "last": last,
-                "high24": high24,
-                "low24": low24,
-                "turnover": turnover,
-                "pump_pct": pump_pct * 100,
-                "near_high": near_high
-            }
-        except Exception as e:
-            logger.error(f"Ошибка проверки {symbol}: {e}")
-            return None
+            ticker = tickers[0] if tickers else None
+        return float(ticker["lastPrice"]) if ticker else None
+
+    def get_candles(self, symbols: List[str]) -> Dict[str, List[Candle]]:
+        """
+        Последние закрытые свечи (старые -> новые) по символам из WebSocket-кэша;
+        новые символы загружаются по REST одновременно, одним пакетом
+        """
+        if not symbols:
+            return {}
+        return self.klines.get_candles(symbols)
+
+    def get_filters(self, symbol: str) -> Dict[str, float]:
+        """Фильтры инструмента (tick_size, qty_step, min_qty, min_notional) из кэша; весь кэш сбрасывается раз в _FILTERS_TTL"""
+        if time.monotonic() - self._filters_cache_ts > _FILTERS_TTL:
+            self._filters_cache.clear()
+            self._filters_cache_ts = time.monotonic()
+        filters = self._filters_cache.get(symbol)
+        if filters is None:
+            filters = OrderManager.extract_filters(self.client.get_instruments(symbol))
+            self._filters_cache[symbol] = filters
+        return filters
+
+    def check_pump_candidates(self, tickers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Фильтр пампа сразу по всем тикерам: колонки NumPy и одна маска вместо цикла с ветвлениями"""
+        tickers = [t for t in tickers if t.get("symbol", "").endswith("USDT")]
+        if not tickers:
+            return []
+
+        def column(key: str) -> np.ndarray:
+            # Строки Bybit разбирает сам NumPy; пустые/битые значения -> 0, такой тикер отсеется по valid
+            values = [t.get(key, 0) for t in tickers]
+            try:
+                return np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                return np.array([_to_float(v) for v in values], dtype=np.float64)
+
+        # Оборот отсеивает большую часть тикеров - остальные колонки разбираем только для прошедших
+        min_turnover = float(self.config.min_turnover_usdt)
+        turnover = column("turnover24h")
+        liquid = np.flatnonzero(turnover >= min_turnover)
+        if not len(liquid):
+            return []
+        tickers = [tickers[i] for i in liquid]
+        turnover = turnover[liquid]
+
+        last = column("lastPrice")
+        high24 = column("highPrice24h")
+        low24 = column("lowPrice24h")
+
+        mask = pump_mask(last, high24, low24, turnover, min_turnover,
+                         self.config.pump_threshold, self.config.near_high_ratio)
+
+        candidates = []
+        for i in np.flatnonzero(mask):
+            low = float(low24[i])
+            price = float(last[i])
+            candidates.append({
+                "symbol": tickers[i]["symbol"],
+                "last": price,
+                "high24": float(high24[i]),
+                "low24": low,
+                "turnover": float(turnover[i]),
+                "pump_pct": (price - low) / low * 100,
+                "near_high": price / float(high24[i])
+            })
+        return candidates
 
     def update_watchlist(self, candidates: List[Dict[str, Any]]):
         now = int(time.time())
         added = 0
-        for cand in candidates:
+        # Инварианты цикла - в локальные переменные
+        tracker = self.tracker
+        positions, watchlist = tracker.positions, tracker.watchlist
+        cooldown = self.config.cooldown_minutes
+        fresh = [
+            cand for cand in candidates
+            if cand["symbol"] not in positions
+            and cand["symbol"] not in watchlist
+            and not tracker.in_cooldown(cand["symbol"], cooldown)
+        ]
+        all_candles = self.get_candles([cand["symbol"] for cand in fresh])
+        for cand in fresh:
             symbol = cand["symbol"]
-            if self.tracker.in_cooldown(symbol, self.config.cooldown_minutes):
+            candles = all_candles.get(symbol)
+            if not candles:
                 continue
-            if symbol in self.tracker.positions:
-                continue
-            if symbol in self.tracker.watchlist:
-                continue
-            klines = self.get_klines(symbol)
-            if not klines or len(klines) < 2:
-                continue
-            last_candle = klines[-2]
-            local_high = float(last_candle[2])
-            self.tracker.watchlist[symbol] = {
-                "local_high": local_high,
+            last_candle = candles[-1]
+            watchlist[symbol] = {
+                "local_high": last_candle.high,
                 "stall": 0,
                 "blocked": False,
                 "created_ts": now,
                 "updated_ts": now,
-                "entry_price": cand["last"]
+                "entry_price": cand["last"],
+                "candle_start": last_candle.start
             }
             added += 1
-            logger.info(f"Добавлен в watchlist: {symbol} (памп {cand['pump_pct']:.1f}%)")
+            logger.info("Добавлен в watchlist: %s (памп %.1f%%)", symbol, cand["pump_pct"])
         if added:
-            self.tracker.save()
+            tracker.mark_dirty()
             logger.info(f"Добавлено {added} новых монет в watchlist")
 
     def check_stall(self) -> List[Tuple[str, Dict[str, Any]]]:
-        if time.time() - self._last_stall_check < 2:
-            return []
-        self._last_stall_check = time.time()
         ready = []
         now = int(time.time())
-        for symbol, data in list(self.tracker.watchlist.items()):
-            if now - data.get("created_ts", now) > self.config.watch_ttl_hours * 3600:
-                logger.info(f"Удален из watchlist (TTL): {symbol}")
-                del self.tracker.watchlist[symbol]
+        # Инварианты цикла - в локальные переменные
+        watchlist = self.tracker.watchlist
+        ttl = self.config.watch_ttl_hours * 3600
+        stall_bars = self.config.stall_bars
+        tp_ratio = 1 - self.config.tp_percent
+        expired = [symbol for symbol, data in watchlist.items()
+                   if now - data.get("created_ts", now) > ttl]
+        for symbol in expired:
+            logger.info("Удален из watchlist (TTL): %s", symbol)
+            del watchlist[symbol]
+            self.klines.unsubscribe(symbol)
+        changed = bool(expired)
+        all_candles = self.get_candles(list(watchlist))
+        for symbol, data in watchlist.items():
+            candles = all_candles.get(symbol)
+            if not candles:
                 continue
-            klines = self.get_klines(symbol)
-            if not klines:
+            # Учитываем каждую свечу новее candle_start: опоздавшие и пришедшие пачкой после
+            # переподключения тоже. Нет новых - закрытая свеча еще не пришла по WebSocket
+            # (в state.json от прежних версий candle_start - строка)
+            candle_start = int(data.get("candle_start") or 0)
+            entry = False
+            for candle in candles:
+                if candle.start <= candle_start:
+                    continue
+                candle_start = candle.start
+                local_high = data["local_high"]
+                if candle.high > local_high:
+                    data["local_high"] = candle.high
+                    data["stall"] = 0
+                    data["blocked"] = False
+                    logger.info("Новый локальный максимум для %s: %.6f", symbol, candle.high)
+                else:
+                    data["stall"] += 1
+                # Вход решает только последняя свеча; блокировка - по каждой
+                entry = False
+                if data["stall"] >= stall_bars and not data.get("blocked", False):
+                    tp_price = local_high * tp_ratio
+                    if candle.close <= tp_price:
+                        data["blocked"] = True
+                        logger.info("⏭ %s: цена уже ниже TP (%.6f <= %.6f), блокируем", symbol, candle.close, tp_price)
+                    else:
+                        entry = True
+            if candle_start == int(data.get("candle_start") or 0):
                 continue
-            last_candle = klines[-2]
-            high = float(last_candle[2])
-            close = float(last_candle[4])
-            local_high = data["local_high"]
-            stall = data["stall"]
-            blocked = data.get("blocked", False)
-            if high > local_high:
-                data["local_high"] = high
-                data["stall"] = 0
-                data["blocked"] = False
-                logger.info(f"Новый локальный максимум для {symbol}: {high:.6f}")
-            else:
-                data["stall"] = stall + 1
+            data["candle_start"] = candle_start
             data["updated_ts"] = now
-            if data["stall"] >= self.config.stall_bars and not blocked:
-                tp_price = local_high * (1 - self.config.tp_percent)
-                if close <= tp_price:
-                    data["blocked"] = True
-                    logger.info(f"⏭ {symbol}: цена уже ниже TP ({close:.6f} <= {tp_price:.6f}), блокируем")
-                else:
-                    ready.append((symbol, data))
-        self.tracker.save()
+            changed = True
+            if entry:
+                ready.append((symbol, data))
+        if changed:
+            self.tracker.mark_dirty()
         return ready
 
     def cancel_all_orders_for_symbol(self, symbol: str):
+        # Один запрос cancel-all вместо get_open_orders + cancel_order на каждый ордер
         try:
-            response = self.client.session.get_open_orders(
+            response = self.client.session.cancel_all_orders(
                 category=self.config.category,
                 symbol=symbol
             )
             if response.get("retCode") != 0:
+                # Не критично: вход продолжается, ошибка видна в логе
+                logger.error(f"Ошибка отмены ордеров {symbol}: {response.get('retMsg')}")
                 return
-            orders = response["result"]["list"]
-            if not orders:
-                return
-            for order in orders:
-                try:
-                    self.client.session.cancel_order(
-                        category=self.config.category,
-                        symbol=symbol,
-                        orderId=order["orderId"]
-                    )
-                except:
-                    pass
-        except:
-            pass
+            cancelled = len(response["result"]["list"])
+            if cancelled:
+                logger.info(f"Отменено ордеров по {symbol}: {cancelled}")
+        except Exception as e:
+            logger.error(f"Ошибка отмены ордеров {symbol}: {e}")
 
     def reload_from_file(self):
         self.tracker.load()
@@ -293,41 +414,30 @@ class ShortBot:
                 return
             
             # Цена
-            tickers = self.get_all_tickers()
-            current_price = None
-            for t in tickers:
-                if t["symbol"] == symbol:
-                    current_price = float(t["lastPrice"])
-                    break
+            current_price = self.get_last_price(symbol)
             if not current_price:
                 logger.error(f"❌ Не удалось получить цену для {symbol}")
                 return
             
             # Расчет количества
-            instr = self.client.get_instruments(symbol)
-            filters = OrderManager.extract_filters(instr)
-            qty = position_usdt / current_price
+            filters = self.get_filters(symbol)
+            # Округление до шагов биржи в Decimal (фикс invalid qty/price)
             qty_step = filters["qty_step"]
-            if qty_step > 0:
-                qty = math.floor(qty / qty_step) * qty_step
-            
-            min_qty = filters["min_qty"]
-            qty = max(qty, min_qty)
-            if qty * current_price < filters["min_notional"]:
-                qty = math.ceil(filters["min_notional"] / current_price / qty_step) * qty_step
-                logger.info(f"📊 Увеличили количество до {qty} для мин. суммы")
-            
-            # Форматирование qty (фикс invalid qty)
-            precision = len(str(qty_step).split('.')[-1]) if '.' in str(qty_step) else 0
-            str_qty = f"{qty:.{precision}f}".rstrip('0').rstrip('.') if '.' in f"{qty}" else f"{qty}"
+            qty_d = OrderManager.floor_to_step(position_usdt / current_price, qty_step)
+            qty_d = max(qty_d, Decimal(str(filters["min_qty"])))
+            if float(qty_d) * current_price < filters["min_notional"]:
+                qty_d = OrderManager.ceil_to_step(filters["min_notional"] / current_price, qty_step)
+                logger.info(f"📊 Увеличили количество до {qty_d} для мин. суммы")
+            str_qty = OrderManager.format_decimal(qty_d)
+            qty = float(qty_d)
             
             # TP/SL расчет
             local_high = data["local_high"]
-            tp_price = local_high * (1 - self.config.tp_percent)
-            sl_price = current_price * self.config.sl_multiplier
             tick_size = filters["tick_size"]
-            tp_price = math.floor(tp_price / tick_size) * tick_size
-            sl_price = math.floor(sl_price / tick_size) * tick_size
+            tp_d = OrderManager.floor_to_step(local_high * (1 - self.config.tp_percent), tick_size)
+            sl_d = OrderManager.floor_to_step(current_price * self.config.sl_multiplier, tick_size)
+            tp_price = float(tp_d)
+            sl_price = float(sl_d)
             
             # Отмена старых ордеров
             logger.info(f"🔄 Отменяем старые ордера для {symbol}")
@@ -342,8 +452,8 @@ class ShortBot:
                 orderType="Market",
                 qty=str_qty,
                 timeInForce="IOC",
-                takeProfit=str(tp_price),
-                stopLoss=str(sl_price),
+                takeProfit=OrderManager.format_decimal(tp_d),
+                stopLoss=OrderManager.format_decimal(sl_d),
                 tpslMode="Full",
                 tpTriggerBy="MarkPrice",
                 slTriggerBy="MarkPrice",
@@ -378,12 +488,11 @@ class ShortBot:
                 "position_usdt": position_usdt,
                 "local_high": local_high
             }
-            self.tracker.add_position(position)
-            
-            # Удаление из watchlist
+            # Удаление из watchlist (add_position сразу сохранит и его)
             if symbol in self.tracker.watchlist:
                 del self.tracker.watchlist[symbol]
-            self.tracker.save()
+            self.klines.unsubscribe(symbol)
+            self.tracker.add_position(position)
             
             # Уведомление
             self.notifier.send_trade_open(
@@ -399,11 +508,26 @@ class ShortBot:
         except Exception as e:
             logger.error(f"❌ Ошибка открытия позиции {symbol}: {e}", exc_info=True)
 
-    def check_positions(self):
-        for symbol, position in list(self.tracker.positions.items()):
+    def check_positions(self, symbols: Optional[List[str]] = None,
+                        exchange_positions: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Сверка позиций трекера с биржей: все или только symbols (закрытия из WebSocket).
+        exchange_positions - снимок get_all_positions; без него позиция запрашивается по символу
+        """
+        if symbols is None:
+            positions = self.tracker.positions.items()
+        else:
+            positions = [(s, self.tracker.positions[s]) for s in symbols if s in self.tracker.positions]
+        closed = []  # удаляем после цикла, одной записью состояния
+        for symbol, position in positions:
             try:
                 # Проверяем наличие на бирже
-                position_info = self.client.get_positions(symbol)
+                if exchange_positions is None:
+                    position_info = self.client.get_positions(symbol)
+                elif symbol in exchange_positions:
+                    position_info = [exchange_positions[symbol]]
+                else:
+                    position_info = []
                 if not position_info or len(position_info) == 0 or float(position_info[0]['size']) == 0:
                     logger.info(f"📌 Позиция {symbol} закрылась на бирже, удаляем из трекера")
 
@@ -414,10 +538,7 @@ class ShortBot:
                     if position_info and len(position_info) > 0:
                         close_price = float(position_info[0].get('avgPrice', 0))
                     else:
-                        close_price = 0
-                        tick = next((t for t in self.get_all_tickers() if t["symbol"] == symbol), None)
-                        if tick:
-                            close_price = float(tick.get("lastPrice", 0))
+                        close_price = self.get_last_price(symbol) or 0
 
                     pnl_usdt = (entry - close_price) * position.get("qty", 0)
                     pnl_percent = (entry - close_price) / entry * 100 if entry != 0 else 0
@@ -435,7 +556,7 @@ class ShortBot:
                         pass
 
                     # удаляем позицию и ставим отсчёт cooldown
-                    self.tracker.remove_position(symbol)
+                    closed.append(symbol)
                     continue
 
                 # Проверка ключей
@@ -444,12 +565,15 @@ class ShortBot:
                 if missing:
                     logger.error(f"⚠️ Неполные данные позиции {symbol} (отсутствуют: {missing}), удаляем")
                     # используем helper чтобы установить cooldown
-                    self.tracker.remove_position(symbol)
+                    closed.append(symbol)
                     continue
 
             except Exception as e:
                 logger.error(f"Ошибка проверки {symbol}: {e}")
 
+        if closed:
+            self.tracker.remove_positions(closed)
+
 
     def run(self):
         self.reload_from_file()
@@ -460,24 +584,42 @@ class ShortBot:
         
         while self.running:
             try:
+                self._wakeup.clear()
                 current_bar = self.get_current_bar_close()
+                # Закрытия TP/SL, пришедшие по WebSocket с прошлой итерации
+                closed = self.positions_ws.drain() if self.positions_ws is not None else []
                 
                 # Суточная статистика в 00:05
-                today = datetime.now().date()
-                if today != last_daily_report and datetime.now().hour == 0 and datetime.now().minute >= 5:
+                now = datetime.now()
+                today = now.date()
+                if today != last_daily_report and now.hour == 0 and now.minute >= 5:
                     self.send_daily_stats()
                     last_daily_report = today
                 
                 if current_bar != self.last_bar_close:
                     self.last_bar_close = current_bar
                     logger.info(f"Новая свеча: {datetime.fromtimestamp(current_bar)}")
-                    
-                    tickers = self.get_all_tickers()
-                    candidates = []
-                    for t in tickers:
-                        cand = self.check_pump_candidate(t)
-                        if cand:
-                            candidates.append(cand)
+
+                    # Тикеры и позиции не зависят друг от друга - запрашиваем параллельно
+                    tickers_future = self._io_pool.submit(self.get_tickers_map)
+                    positions_future = self._io_pool.submit(self.client.get_all_positions) if self.tracker.positions else None
+
+                    tickers = tickers_future.result()
+                    # Сверка позиций до новых входов: снимок не знает о позициях, открытых на этой свече
+                    if positions_future is not None:
+                        try:
+                            exchange_positions = positions_future.result()
+                        except Exception as e:
+                            logger.error(f"Ошибка получения позиций: {e}")
+                            exchange_positions = None
+                        self.check_positions(exchange_positions=exchange_positions)
+
+                    # Капитал риск-менеджера по балансу биржи (после учета закрытий, до расчета размеров входа):
+                    # локальный PnL не видит комиссий и фандинга
+                    if self.wallet is not None and self.wallet.balance is not None:
+                        self.risk_manager.sync_capital(self.wallet.balance)
+
+                    candidates = self.check_pump_candidates(list(tickers.values()))
                     if candidates:
                         logger.info(f"Найдено кандидатов: {len(candidates)}")
                         self.update_watchlist(candidates)
@@ -488,20 +630,39 @@ class ShortBot:
                         for symbol, data in ready:
                             self.open_position(symbol, data)
 
-                    self.check_positions()
+                    # Цены на следующую свечу - по WebSocket для актуальных watchlist и позиций
+                    try:
+                        self.tickers_ws.sync(set(self.tracker.watchlist) | set(self.tracker.positions))
+                    except Exception as e:
+                        logger.error(f"Ошибка подписки на тикеры: {e}")
 
                     logger.info(f"Статистика: watchlist={len(self.tracker.watchlist)}, "
                             f"positions={len(self.tracker.positions)}, "
                             f"balance=${self.risk_manager.current_capital:.2f}")
+                elif closed:
+                    # Между свечами сверяем только закрывшиеся позиции
+                    self.check_positions(closed)
 
-                time.sleep(self.config.wake_seconds)
+                # Одна запись состояния за итерацию, если что-то менялось
+                self.tracker.flush_if_dirty()
+                # Спим до следующего события, а не опрашиваем каждые несколько секунд
+                self._wakeup.wait(self.seconds_to_next_wake())
 
             except KeyboardInterrupt:
                 break
             except Exception as e:
                 logger.error(f"Ошибка в основном цикле: {e}", exc_info=True)
-                time.sleep(10)
-
+                self._wakeup.wait(10)
+
+        self.tracker.flush_if_dirty()
+        self.klines.close()
+        self.tickers_ws.close()
+        if self.wallet is not None:
+            self.wallet.close()
+        if self.positions_ws is not None:
+            self.positions_ws.close()
+        self._io_pool.shutdown(wait=False)
+        self.client.close()
         logger.info("Бот остановлен")
     
     def send_daily_stats(self):
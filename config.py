@@ -23,12 +23,13 @@ class BotConfig:
     # Technical
     category: str = "linear"
     timeframe: str = "15"
-    wake_seconds: int = 5
+    wake_seconds: int = 5                     # задержка проверки после закрытия свечи
     cooldown_minutes: int = 60
     watch_ttl_hours: int = 24
     
     # API
     max_retries: int = 3
+    use_ws_trade_api: bool = False           # ордера через WebSocket Trade API (REST - запасной путь)
     retry_delays: Optional[List[int]] = None
     
     # Paths
@@ -1,23 +1,49 @@
 ﻿import time
+import uuid
 import logging
+import orjson
 from typing import Dict, Any, Optional, List
+from requests.adapters import HTTPAdapter
+from pybit.exceptions import InvalidRequestError
 from pybit.unified_trading import HTTP
 from tenacity import retry, stop_after_attempt, wait_exponential
+from live.trade_ws import BybitTradeWS
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_ORDER_LINK_ID = 110072  # retCode Bybit: ордер с таким orderLinkId уже есть
+
+def _orjson_response(response, *args, **kwargs):
+    """Хук requests: ответы Bybit разбирает orjson вместо stdlib json"""
+    response.json = lambda **_: orjson.loads(response.content)
+    return response
+
 class BybitClient:
     """Обертка для Bybit API с retry и обработкой ошибок"""
     
-    def __init__(self, api_key: str, api_secret: str, testnet: bool = False):
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = False, use_ws_trade_api: bool = False):
         self.session = HTTP(
             testnet=testnet,
             api_key=api_key,
             api_secret=api_secret
         )
+        # pybit ходит через один requests.Session (self.session.client): держим пул keep-alive соединений,
+        # чтобы запросы не платили за TCP+TLS. Повторы делает pybit/tenacity, адаптер не ретраит
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, pool_block=True, max_retries=0)
+        self.session.client.mount("https://", adapter)
+        self.session.client.headers["Connection"] = "keep-alive"
+        self.session.client.hooks["response"].append(_orjson_response)
         self.rate_limit_remaining = 50
         self.rate_limit_reset = 0
         self.category = "linear"
+
+        # Ордера через WebSocket Trade API, REST - запасной путь
+        self.trade_ws: Optional[BybitTradeWS] = None
+        if use_ws_trade_api:
+            try:
+                self.trade_ws = BybitTradeWS(api_key, api_secret, testnet=testnet)
+            except Exception as e:
+                logger.error(f"WebSocket Trade API недоступен, ордера пойдут через REST: {e}")
     
     @retry(
         stop=stop_after_attempt(3),
@@ -41,9 +67,12 @@ class BybitClient:
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=1, max=10)
     )
-    def get_tickers(self) -> Dict[str, Any]:
-        """Получить все тикеры"""
-        response = self.session.get_tickers(category="linear")
+    def get_tickers(self, symbol: Optional[str] = None) -> Dict[str, Any]:
+        """Получить все тикеры или тикер одного символа"""
+        if symbol:
+            response = self.session.get_tickers(category="linear", symbol=symbol)
+        else:
+            response = self.session.get_tickers(category="linear")
         
         if response.get("retCode") != 0:
             raise RuntimeError(f"API Error: {response.get('retMsg')}")
@@ -99,13 +128,87 @@ class BybitClient:
         return response
     
     def place_order(self, **kwargs) -> Dict[str, Any]:
-        """Разместить ордер"""
+        """Разместить ордер: через WebSocket Trade API, если он подключен, иначе REST"""
+        if self.trade_ws is not None:
+            # orderLinkId делает повтор через REST безопасным: дубль биржа отклонит
+            kwargs.setdefault("orderLinkId", uuid.uuid4().hex)
+            category = kwargs.get("category", self.category)
+            try:
+                return self.trade_ws.place_order(**kwargs)
+            except TimeoutError as e:
+                logger.warning(f"{e}, проверяем ордер {kwargs['orderLinkId']} через REST")
+                placed = self._find_placed_order(category, kwargs["symbol"], kwargs["orderLinkId"])
+                if placed is not None:
+                    return placed
+            except RuntimeError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket Trade API: {e}, отправляем ордер через REST")
+
+            try:
+                response = self.session.place_order(**kwargs)
+            except InvalidRequestError as e:
+                if e.status_code != DUPLICATE_ORDER_LINK_ID:
+                    raise
+                response = {"retCode": e.status_code, "retMsg": e.message}
+            if response.get("retCode") == DUPLICATE_ORDER_LINK_ID:
+                # Ордер из WebSocket дошел до биржи, просто еще не был виден при проверке
+                placed = self._find_placed_order(category, kwargs["symbol"], kwargs["orderLinkId"])
+                if placed is not None:
+                    return placed
+            if response.get("retCode") != 0:
+                raise RuntimeError(f"API Error: {response.get('retMsg')}")
+            self._update_rate_limits(response)
+            return response
+
         response = self.session.place_order(**kwargs)
         if response.get("retCode") != 0:
             raise RuntimeError(f"API Error: {response.get('retMsg')}")
         self._update_rate_limits(response)
         return response
     
+    def get_all_positions(self, settle_coin: str = "USDT") -> Dict[str, Dict[str, Any]]:
+        """Все открытые позиции одним запросом (с пагинацией): symbol -> позиция"""
+        positions: Dict[str, Dict[str, Any]] = {}
+        cursor = None
+        while True:
+            params = {"category": self.category, "settleCoin": settle_coin, "limit": 200}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.session.get_positions(**params)
+            if response.get("retCode") != 0:
+                raise RuntimeError(f"API Error: {response.get('retMsg')}")
+            for position in response["result"]["list"]:
+                positions[position["symbol"]] = position
+            cursor = response["result"].get("nextPageCursor")
+            if not cursor:
+                return positions
+
+    def _find_placed_order(self, category: str, symbol: str, order_link_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Дошел ли ордер со статусом "неизвестно" до биржи: ищем его в реальном времени, в истории,
+        а если не виден ни там, ни там - смотрим позицию (перед входом ее по символу нет).
+        Ответ в формате place_order или None
+        """
+        for get_orders in (self.session.get_open_orders, self.session.get_order_history):
+            try:
+                orders = get_orders(category=category, symbol=symbol, orderLinkId=order_link_id)["result"]["list"]
+            except Exception as e:
+                logger.error(f"Ошибка поиска ордера {order_link_id}: {e}")
+                continue
+            if orders:
+                order = {"orderId": orders[0]["orderId"], "orderLinkId": orders[0]["orderLinkId"]}
+                return {"retCode": 0, "retMsg": "OK", "result": order}
+        positions = self.get_positions(symbol)
+        if positions and float(positions[0].get("size") or 0) > 0:
+            logger.warning(f"Ордер {order_link_id} не найден, но позиция {symbol} открыта - считаем его исполненным")
+            return {"retCode": 0, "retMsg": "OK", "result": {"orderLinkId": order_link_id}}
+        return None
+
+    def close(self):
+        if self.trade_ws is not None:
+            self.trade_ws.close()
+
     def get_positions(self, symbol: str) -> List[Dict[str, Any]]:
         """Получить информацию о позиции по символу"""
         try:
@@ -0,0 +1,43 @@
+﻿import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def _pump_mask_numpy(last: np.ndarray, high24: np.ndarray, low24: np.ndarray, turnover: np.ndarray,
+                     min_turnover: float, pump_thr: float, near_thr: float) -> np.ndarray:
+    """Маска пампа на NumPy - запасной вариант без numba"""
+    valid = (last > 0) & (high24 > 0) & (low24 > 0)
+    pump_pct = (last - low24) / np.where(valid, low24, 1)
+    near_high = last / np.where(valid, high24, 1)
+    return valid & (turnover >= min_turnover) & (pump_pct >= pump_thr) & (near_high >= near_thr)
+
+
+if HAS_NUMBA:
+    @njit(cache=True, nogil=True)
+    def pump_mask(last, high24, low24, turnover, min_turnover, pump_thr, near_thr):
+        """Маска пампа одним проходом по тикерам (без временных массивов)"""
+        n = last.shape[0]
+        out = np.zeros(n, np.bool_)
+        for i in range(n):
+            if last[i] <= 0 or high24[i] <= 0 or low24[i] <= 0:
+                continue
+            if turnover[i] < min_turnover:
+                continue
+            if (last[i] - low24[i]) / low24[i] < pump_thr:
+                continue
+            if last[i] / high24[i] < near_thr:
+                continue
+            out[i] = True
+        return out
+else:
+    pump_mask = _pump_mask_numpy
+
+
+def warmup():
+    """Компиляция pump_mask до первой свечи"""
+    x = np.ones(1, dtype=np.float64)
+    pump_mask(x, x, x, x, 0.0, 0.0, 0.0)
@@ -0,0 +1,157 @@
+﻿import asyncio
+import threading
+import logging
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+import aiohttp
+import orjson
+from pybit.unified_trading import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних закрытых свечей держать на символ
+KLINE_DEPTH = 4
+MAX_IN_FLIGHT = 10  # одновременных REST-запросов при начальной загрузке
+RATE_LIMIT_CODE = 10006  # retCode Bybit "слишком много запросов"
+RATE_LIMIT_RETRIES = 3
+
+KLINE_URL = "https://api.bybit.com/v5/market/kline"
+KLINE_URL_TESTNET = "https://api-testnet.bybit.com/v5/market/kline"
+
+
+async def _fetch_closed_klines(session, semaphore, url: str, symbol: str, interval: str) -> Optional[List[list]]:
+    """Закрытые свечи символа по REST (старые -> новые) или None"""
+    params = {"category": "linear", "symbol": symbol, "interval": interval, "limit": KLINE_DEPTH + 1}
+    try:
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            async with semaphore:
+                async with session.get(url, params=params) as response:
+                    data = orjson.loads(await response.read())
+            if data.get("retCode") != RATE_LIMIT_CODE or attempt == RATE_LIMIT_RETRIES:
+                break
+            # Упёрлись в лимит - ждем вне семафора, экспоненциально: 1, 2, 4 с
+            await asyncio.sleep(2 ** attempt)
+        if data.get("retCode") != 0:
+            raise RuntimeError(f"API Error: {data.get('retMsg')}")
+        # REST отдает от новых к старым, первая - текущая незакрытая
+        return data["result"]["list"][1:][::-1]
+    except Exception as e:
+        logger.error(f"Не удалось получить свечи для {symbol}: {e}")
+        return None
+
+
+async def fetch_closed_klines(symbols: List[str], interval: str, testnet: bool = False,
+                              max_in_flight: int = MAX_IN_FLIGHT) -> Dict[str, Optional[List[list]]]:
+    """Свечи всех символов одновременно: symbol -> закрытые свечи или None"""
+    url = KLINE_URL_TESTNET if testnet else KLINE_URL
+    semaphore = asyncio.Semaphore(max_in_flight)
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session:
+        fetched = await asyncio.gather(*(_fetch_closed_klines(session, semaphore, url, s, interval) for s in symbols))
+    return dict(zip(symbols, fetched))
+
+class Candle(NamedTuple):
+    """Закрытая свеча; start - время открытия в мс"""
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+
+
+def _candle_from_rest(row: list) -> Candle:
+    """Строка REST [start, open, high, low, close, volume, turnover] -> Candle"""
+    return Candle(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]))
+
+
+class KlineStream:
+    """
+    Закрытые свечи по публичному WebSocket Bybit (kline.<interval>.<symbol>)
+    вместо REST-опроса каждого символа на каждой свече.
+    На символ - deque(maxlen=KLINE_DEPTH) уже разобранных Candle, старые -> новые
+    """
+
+    def __init__(self, interval: str = "15", testnet: bool = False):
+        self.interval = interval
+        self.testnet = testnet
+        self._ws: Optional[WebSocket] = None
+        self._lock = threading.Lock()
+        self._candles: Dict[str, Deque[Candle]] = {}
+
+    def _topic(self, symbol: str) -> str:
+        return f"kline.{self.interval}.{symbol}"
+
+    def subscribe(self, symbol: str, closed_klines: List[list]) -> bool:
+        """
+        Подписаться на символ; closed_klines - закрытые свечи из REST для старта.
+        False - подписаться не удалось, символ будет загружен по REST заново
+        """
+        with self._lock:
+            if symbol in self._candles:
+                return True
+            # До подписки: первое сообщение может прийти раньше, чем вернется kline_stream
+            self._candles[symbol] = deque(map(_candle_from_rest, closed_klines), maxlen=KLINE_DEPTH)
+
+        try:
+            # Соединение открывается при первой подписке
+            if self._ws is None:
+                self._ws = WebSocket(testnet=self.testnet, channel_type="linear")
+            self._ws.kline_stream(interval=self.interval, symbol=symbol, callback=self._on_message)
+        except Exception as e:
+            # Иначе deque без обновлений осталась бы навсегда, а повторная подписка - не случилась
+            with self._lock:
+                self._candles.pop(symbol, None)
+            logger.error(f"Ошибка подписки на свечи {symbol}: {e}")
+            return False
+        logger.info("Подписка на свечи %s", symbol)
+        return True
+
+    def unsubscribe(self, symbol: str):
+        with self._lock:
+            if self._candles.pop(symbol, None) is None:
+                return
+        try:
+            self._ws.unsubscribe(self._topic(symbol))
+        except Exception as e:
+            logger.error(f"Ошибка отписки {symbol}: {e}")
+
+    def get_candles(self, symbols: List[str]) -> Dict[str, List[Candle]]:
+        """
+        Закрытые свечи (копии, старые -> новые) по списку символов. Неподписанные символы загружаются
+        по REST одним пакетом (asyncio.gather) и подписываются; символы без данных пропускаются
+        """
+        result = {}
+        missing = []
+        with self._lock:
+            for symbol in symbols:
+                candles = self._candles.get(symbol)
+                if candles is None:
+                    missing.append(symbol)
+                elif candles:
+                    result[symbol] = list(candles)
+        if missing:
+            fetched = asyncio.run(fetch_closed_klines(missing, self.interval, self.testnet))
+            for symbol, klines in fetched.items():
+                if klines:
+                    self.subscribe(symbol, klines)
+                    result[symbol] = [_candle_from_rest(row) for row in klines[-KLINE_DEPTH:]]
+        return result
+
+    def _on_message(self, message: dict):
+        """Колбэк pybit (поток WebSocket): сохраняем только подтвержденные свечи"""
+        symbol = message.get("topic", "").rsplit(".", 1)[-1]
+        for k in message.get("data", []):
+            if not k.get("confirm"):
+                continue
+            start = int(k["start"])
+            with self._lock:
+                candles = self._candles.get(symbol)
+                if candles is None:
+                    return
+                if candles and candles[-1].start >= start:
+                    continue
+                candles.append(Candle(start, float(k["open"]), float(k["high"]), float(k["low"]), float(k["close"])))
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.exit()
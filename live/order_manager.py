@@ -1,5 +1,5 @@
-﻿import math
-import logging
+﻿import logging
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -19,34 +19,49 @@ class OrderManager:
             'max_leverage': float(result.get('leverageFilter', {}).get('maxLeverage', 1))
         }
     
+    @staticmethod
+    def floor_to_step(value: float, step: float) -> Decimal:
+        """
+        Вниз до кратного шагу (qtyStep/tickSize) в Decimal: float-деление дает 0.3 // 0.1 = 2
+        и хвосты вида 0.30000000000000004, на которые биржа отвечает invalid qty/price
+        """
+        return OrderManager._to_step(value, step, ROUND_FLOOR)
+    
+    @staticmethod
+    def ceil_to_step(value: float, step: float) -> Decimal:
+        """Вверх до кратного шагу в Decimal"""
+        return OrderManager._to_step(value, step, ROUND_CEILING)
+    
+    @staticmethod
+    def _to_step(value: float, step: float, rounding: str) -> Decimal:
+        # str(float) - кратчайшее представление: Decimal(str(0.1)) == Decimal('0.1')
+        value_d = Decimal(str(value))
+        if step <= 0:
+            return value_d
+        step_d = Decimal(str(step))
+        return (value_d / step_d).to_integral_value(rounding) * step_d
+    
+    @staticmethod
+    def format_decimal(value: Decimal) -> str:
+        """Строка для API без экспоненты и хвостовых нулей: 12.300 -> '12.3', 1E+3 -> '1000'"""
+        return format(value.normalize(), 'f')
+    
     @staticmethod
     def calculate_qty(notional: float, price: float, filters: Dict[str, float]) -> float:
-        min_qty = filters['min_qty']
         qty_step = filters['qty_step']
-        min_notional = filters['min_notional']
-        
-        # Базовое количество
-        qty = notional / price
         
-        # Округление вниз до шага с учетом точности
-        if qty_step > 0:
-            # Округляем до нужного количества знаков
-            precision = len(str(qty_step).split('.')[-1]) if '.' in str(qty_step) else 0
-            qty = math.floor(qty / qty_step) * qty_step
-            qty = round(qty, precision)  # Добавляем явное округление
+        # Базовое количество, вниз до шага
+        qty = OrderManager.floor_to_step(notional / price, qty_step)
         
         # Не меньше минимума
-        qty = max(qty, min_qty)
+        qty = max(qty, Decimal(str(filters['min_qty'])))
         
         # Проверка минимальной суммы
-        if qty * price < min_notional:
-            qty = math.ceil(min_notional / price / qty_step) * qty_step
-            qty = round(qty, precision)
+        if float(qty) * price < filters['min_notional']:
+            qty = OrderManager.ceil_to_step(filters['min_notional'] / price, qty_step)
         
-        return qty
+        return float(qty)
     
     @staticmethod
     def round_price(price: float, tick_size: float) -> float:
-        if tick_size <= 0:
-            return price
-        return math.floor(price / tick_size) * tick_size
+        return float(OrderManager.floor_to_step(price, tick_size))
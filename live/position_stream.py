@@ -0,0 +1,49 @@
+﻿import queue
+import logging
+from typing import Callable, List, Optional
+from pybit.unified_trading import WebSocket
+
+logger = logging.getLogger(__name__)
+
+class PositionStream:
+    """
+    Закрытия позиций из приватного WebSocket Bybit (топик position).
+    TP/SL исполняет биржа; поток только сообщает, что позиция обнулилась - символы копятся
+    в очереди, а сверку и учет делает основной поток (колбэк pybit не трогает состояние бота)
+    """
+
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = False,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.on_close = on_close
+        self._closed: "queue.Queue[str]" = queue.Queue()
+        self._ws = WebSocket(testnet=testnet, channel_type="private", api_key=api_key, api_secret=api_secret)
+        self._ws.position_stream(callback=self._on_message)
+
+    def _on_message(self, message: dict):
+        closed = False
+        for position in message.get("data", []):
+            if position.get("category") != "linear":
+                continue
+            try:
+                size = float(position.get("size") or 0)
+            except (TypeError, ValueError):
+                continue
+            if size == 0:
+                self._closed.put(position["symbol"])
+                closed = True
+        if closed and self.on_close is not None:
+            self.on_close()
+
+    def drain(self) -> List[str]:
+        """Символы, закрывшиеся с прошлого вызова (без повторов)"""
+        symbols = []
+        while True:
+            try:
+                symbol = self._closed.get_nowait()
+            except queue.Empty:
+                return symbols
+            if symbol not in symbols:
+                symbols.append(symbol)
+
+    def close(self):
+        self._ws.exit()
@@ -1,7 +1,8 @@
-﻿import json
+﻿import os
 import time
+import orjson
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -12,16 +13,18 @@ class PositionTracker:
         self.positions: Dict[str, Any] = {}
         self.cooldowns: Dict[str, int] = {}
         self.watchlist: Dict[str, Any] = {}
+        self._dirty = False  # есть несохраненные изменения watchlist/cooldowns
         self.load()
     
     def load(self):
         if self.state_file.exists():
             try:
-                with open(self.state_file, 'r') as f:
-                    data = json.load(f)
+                with open(self.state_file, 'rb') as f:
+                    data = orjson.loads(f.read())
                     self.positions = data.get('positions', {})
                     self.cooldowns = data.get('cooldowns', {})
                     self.watchlist = data.get('watchlist', {})
+                    self._dirty = False
                     logger.info(f"Loaded {len(self.positions)} positions, {len(self.watchlist)} watchlist")
             except Exception as e:
                 logger.error(f"Error loading state: {e}")
@@ -35,27 +38,41 @@ class PositionTracker:
             'updated_at': int(time.time())
         }
         
-        # Сохраняем с временным файлом для атомарности
+        # Пишем во временный файл и подменяем: os.replace атомарен, файл не бывает пустым или обрезанным
         tmp_file = self.state_file.with_suffix('.tmp')
-        if tmp_file.exists():
-            tmp_file.unlink()
-        
-        with open(tmp_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        
-        if self.state_file.exists():
-            self.state_file.unlink()
-        
-        tmp_file.rename(self.state_file)
+        with open(tmp_file, 'wb') as f:
+            # numpy-скаляры (цены после расчетов) stdlib json принимал - сохраняем это поведение
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.state_file)
+        self._dirty = False
+    
+    def mark_dirty(self):
+        """Отложенное сохранение: файл запишет flush_if_dirty в конце цикла бота"""
+        self._dirty = True
+    
+    def flush_if_dirty(self):
+        if self._dirty:
+            self.save()
     
     def add_position(self, position: Dict[str, Any]):
+        # Позиции на бирже сохраняем сразу, не дожидаясь конца цикла
         self.positions[position['symbol']] = position
         self.save()
     
     def remove_position(self, symbol: str):
-        if symbol in self.positions:
-            del self.positions[symbol]
-            self.cooldowns[symbol] = int(time.time())
+        self.remove_positions([symbol])
+    
+    def remove_positions(self, symbols: List[str]):
+        """Удалить позиции и поставить cooldown; одна запись файла на все"""
+        now = int(time.time())
+        removed = False
+        for symbol in symbols:
+            if self.positions.pop(symbol, None) is not None:
+                self.cooldowns[symbol] = now
+                removed = True
+        if removed:
             self.save()
     
     def in_cooldown(self, symbol: str, cooldown_minutes: int) -> bool:
@@ -66,12 +83,12 @@ class PositionTracker:
     
     def update_watchlist(self, symbol: str, data: Dict[str, Any]):
         self.watchlist[symbol] = data
-        self.save()
+        self.mark_dirty()
     
     def remove_from_watchlist(self, symbol: str):
         if symbol in self.watchlist:
             del self.watchlist[symbol]
-            self.save()
+            self.mark_dirty()
     
     def reload_from_file(self):
         """Принудительно перезагрузить состояние из файла"""
@@ -85,6 +85,12 @@ class RiskManager:
         
         return True, "OK"
     
+    def sync_capital(self, capital):
+        """Капитал по данным биржи (учитывает комиссии, фандинг, пополнения)"""
+        self.current_capital = capital
+        if self.current_capital > self.peak_capital:
+            self.peak_capital = self.current_capital
+    
     def on_trade_result(self, pnl_usdt, pnl_percent, symbol):
         self.current_capital += pnl_usdt
         self.today_pnl += pnl_usdt
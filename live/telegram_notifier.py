@@ -13,6 +13,7 @@ class TelegramNotifier:
         
         if self.enabled:
             self.base_url = f"https://api.telegram.org/bot{bot_token}"
+            self.session = requests.Session()  # одно keep-alive соединение на все уведомления
     
     def send_message(self, text: str, parse_mode: str = "HTML") -> bool:
         if not self.enabled:
@@ -25,7 +26,7 @@ class TelegramNotifier:
                 "text": text,
                 "parse_mode": parse_mode
             }
-            response = requests.post(url, data=data, timeout=10)
+            response = self.session.post(url, data=data, timeout=10)
             if response.status_code != 200:
                 logger.error(f"Telegram error: {response.text}")
             return response.status_code == 200
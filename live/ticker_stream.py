@@ -0,0 +1,79 @@
+﻿import threading
+import time
+import logging
+from typing import Dict, Iterable, Optional, Set, Tuple
+from pybit.unified_trading import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Bybit шлет тикер раз в 100 мс; дольше без сообщений - цене не доверяем
+PRICE_MAX_AGE = 5.0
+
+
+class TickerStream:
+    """
+    Последние цены по публичному WebSocket Bybit (tickers.<symbol>) для символов
+    watchlist и открытых позиций - вместо полного REST-снимка тикеров ради одной цены
+    """
+
+    def __init__(self, testnet: bool = False):
+        self.testnet = testnet
+        self._ws: Optional[WebSocket] = None
+        self._lock = threading.Lock()
+        self._symbols: Set[str] = set()
+        self._prices: Dict[str, Tuple[float, float]] = {}  # symbol -> (lastPrice, monotonic)
+
+    def sync(self, symbols: Iterable[str]):
+        """Оставить подписки ровно на symbols: новые подписать, лишние отписать"""
+        wanted = set(symbols)
+        with self._lock:
+            added = wanted - self._symbols
+            removed = self._symbols - wanted
+            # До подписки: снимок может прийти раньше, чем вернется ticker_stream
+            self._symbols = wanted
+            for symbol in removed:
+                self._prices.pop(symbol, None)
+        for symbol in removed:
+            try:
+                self._ws.unsubscribe(f"tickers.{symbol}")
+            except Exception as e:
+                logger.error(f"Ошибка отписки от тикера {symbol}: {e}")
+        # По символу на подписку, как в KlineStream: pybit отписывает сообщение подписки
+        # целиком, и отписка одного символа из пакета сняла бы весь пакет
+        for symbol in sorted(added):
+            try:
+                # Соединение открывается при первой подписке
+                if self._ws is None:
+                    self._ws = WebSocket(testnet=self.testnet, channel_type="linear")
+                self._ws.ticker_stream(symbol=symbol, callback=self._on_message)
+            except Exception as e:
+                # Не подписались - следующий sync попробует снова
+                logger.error(f"Ошибка подписки на тикер {symbol}: {e}")
+                with self._lock:
+                    self._symbols.discard(symbol)
+
+    def last_price(self, symbol: str, max_age: float = PRICE_MAX_AGE) -> Optional[float]:
+        """Последняя цена символа или None, если подписки нет или цена старше max_age секунд"""
+        with self._lock:
+            entry = self._prices.get(symbol)
+        if entry is None or time.monotonic() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def _on_message(self, message: dict):
+        """Колбэк pybit: снимок и дельты; дельта без lastPrice значит, что цена не менялась"""
+        data = message.get("data") or {}
+        symbol = data.get("symbol")
+        now = time.monotonic()
+        with self._lock:
+            if symbol not in self._symbols:
+                return
+            price = data.get("lastPrice")
+            if price:
+                self._prices[symbol] = (float(price), now)
+            elif symbol in self._prices:
+                self._prices[symbol] = (self._prices[symbol][0], now)
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.exit()
@@ -0,0 +1,80 @@
+﻿import json
+import uuid
+import logging
+import threading
+from typing import Dict, Any
+from pybit import _helpers
+from pybit.unified_trading import WebSocketTrading
+
+logger = logging.getLogger(__name__)
+
+class _TradingSocket(WebSocketTrading):
+    """
+    WebSocketTrading pybit с поправками: ответ с ошибкой тоже уходит в колбэк
+    (pybit его только логирует), колбэк регистрируется до отправки запроса,
+    а reqId возвращается - чтобы снять колбэк запроса без ответа.
+    Поздний ответ на снятый запрос пропускается: pybit падает на нем с KeyError
+    и закрывает соединение
+    """
+
+    def _pop_callback(self, topic):
+        callback = self.callback_directory.pop(topic, None)
+        if callback is None:
+            logger.warning(f"Ответ WebSocket Trade API на неизвестный запрос {topic} пропущен")
+            return lambda message: None
+        return callback
+
+    def _process_error_message(self, message):
+        callback = self.callback_directory.pop(message.get("reqId"), None)
+        if callback is not None:
+            callback(message)
+        else:
+            logger.error(f"Ошибка WebSocket Trade API: {message}")
+
+    def _send_order_operation(self, operation, callback, request) -> str:
+        request_id = str(uuid.uuid4())
+        message = {
+            "reqId": request_id,
+            "header": {"X-BAPI-TIMESTAMP": _helpers.generate_timestamp()},
+            "op": operation,
+            "args": [request],
+        }
+        if self.recv_window:
+            message["header"]["X-BAPI-RECV-WINDOW"] = self.recv_window
+        if self.referral_id:
+            message["header"]["Referer"] = self.referral_id
+        self._set_callback(request_id, callback)
+        self.ws.send(json.dumps(message))
+        return request_id
+
+
+class BybitTradeWS:
+    """Ордера через WebSocket Trade API Bybit (/v5/trade): одно постоянное авторизованное соединение вместо HTTP-запроса на ордер"""
+
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = False, timeout: float = 5.0):
+        self.timeout = timeout
+        self._ws = _TradingSocket(testnet=testnet, api_key=api_key, api_secret=api_secret)
+
+    def place_order(self, **kwargs) -> Dict[str, Any]:
+        """
+        Разместить ордер и дождаться ACK биржи. Ответ в формате REST ({"retCode", "retMsg", "result"});
+        RuntimeError - биржа отклонила ордер, TimeoutError - ответа нет (статус ордера неизвестен)
+        """
+        done = threading.Event()
+        reply: Dict[str, Any] = {}
+
+        def on_reply(message):
+            reply.update(message)
+            done.set()
+
+        request_id = self._ws._send_order_operation("order.create", on_reply, kwargs)
+        if not done.wait(self.timeout):
+            # Поздний ответ уже никто не ждет - не копим колбэки
+            self._ws.callback_directory.pop(request_id, None)
+            raise TimeoutError(f"Нет ответа WebSocket Trade API за {self.timeout}s")
+        if reply.get("retCode") != 0:
+            raise RuntimeError(f"API Error: {reply.get('retMsg')}")
+        return {"retCode": 0, "retMsg": reply.get("retMsg", "OK"), "result": reply.get("data", {})}
+
+    def close(self):
+        self._ws.exit()
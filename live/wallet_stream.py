@@ -0,0 +1,40 @@
+﻿import threading
+import logging
+from typing import Optional
+from pybit.unified_trading import WebSocket
+
+logger = logging.getLogger(__name__)
+
+class WalletStream:
+    """
+    Баланс кошелька из приватного WebSocket Bybit (топик wallet) вместо REST-опроса.
+    Колбэк только запоминает значение; применять его к риск-менеджеру - в основном потоке
+    """
+
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = False, coin: str = "USDT"):
+        self.coin = coin
+        self._lock = threading.Lock()
+        self._balance: Optional[float] = None
+        self._ws = WebSocket(testnet=testnet, channel_type="private", api_key=api_key, api_secret=api_secret)
+        self._ws.wallet_stream(callback=self._on_message)
+
+    @property
+    def balance(self) -> Optional[float]:
+        """Последний walletBalance монеты или None, если обновлений еще не было"""
+        with self._lock:
+            return self._balance
+
+    def _on_message(self, message: dict):
+        for account in message.get("data", []):
+            for coin in account.get("coin", []):
+                if coin.get("coin") != self.coin:
+                    continue
+                try:
+                    balance = float(coin["walletBalance"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                with self._lock:
+                    self._balance = balance
+
+    def close(self):
+        self._ws.exit()
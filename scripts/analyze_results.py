@@ -1,4 +1,6 @@
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # только сохраняем png, GUI не нужен
 import matplotlib.pyplot as plt
 from pathlib import Path
 import json
@@ -13,16 +15,21 @@ def load_results(folder_path='./backtest_results'):
     trades_file = results_dir / 'trades_all.csv'
     if not trades_file.exists():
         print(f"❌ Файл trades_all.csv не найден в {results_dir}")
-        return None
+        return None, None
     
-    df = pd.read_csv(trades_file)
+    # Многопоточный Arrow-парсер, время разбирается сразу при чтении
+    df = pd.read_csv(trades_file, engine='pyarrow', parse_dates=['entry_time', 'exit_time'])
     
-    # Конвертируем время
-    df['entry_time'] = pd.to_datetime(df['entry_time'])
-    df['exit_time'] = pd.to_datetime(df['exit_time'])
+    # Arrow отдаёт время в секундах, а пустые строки не превращает в NaN
+    df[['entry_time', 'exit_time']] = df[['entry_time', 'exit_time']].astype('datetime64[ns]')
+    if 'exit_reason' in df.columns:
+        df['exit_reason'] = df['exit_reason'].replace('', np.nan).astype('category')
+    
+    # Группировки по символу идут по целочисленным кодам категорий
+    df['symbol'] = df['symbol'].astype('category')
     
     # Фильтруем ТОЛЬКО закрытые сделки
-    df_closed = df.dropna(subset=['exit_time', 'pnl_usdt'])
+    df_closed = df.dropna(subset=['exit_time', 'pnl_usdt']).reset_index(drop=True)
     
     print(f"\n📊 Всего записей в файле: {len(df)}")
     print(f"📈 Закрытых сделок: {len(df_closed)}")
@@ -30,13 +37,24 @@ def load_results(folder_path='./backtest_results'):
     
     if len(df_closed) == 0:
         print("❌ Нет закрытых сделок для анализа")
-        return None
-    
-    df_closed['duration_hours'] = (df_closed['exit_time'] - df_closed['entry_time']).dt.total_seconds() / 3600
-    
-    return df_closed
+        return None, None
+    
+    # Длительность прямо по int64-буферам datetime64[ns]
+    dur_ns = df_closed['exit_time'].values.view('i8') - df_closed['entry_time'].values.view('i8')
+    df_closed['duration_hours'] = dur_ns / 3.6e12
+    
+    # Агрегат по символам считаем один раз - он нужен и в анализе, и на графиках
+    symbol_agg = df_closed.assign(_win=(df_closed['pnl_usdt'] > 0).astype(np.int8)).groupby(
+        'symbol', sort=False, observed=True).agg(
+        sum=('pnl_usdt', 'sum'),
+        count=('pnl_usdt', 'count'),
+        mean=('pnl_usdt', 'mean'),
+        wr=('_win', 'mean'),
+    )
+    
+    return df_closed, symbol_agg
 
-def analyze_trades(df):
+def analyze_trades(df, symbol_agg):
     """Детальный анализ сделок"""
     print("\n" + "=" * 60)
     print("📊 ДЕТАЛЬНЫЙ АНАЛИЗ СДЕЛОК")
@@ -54,22 +72,20 @@ def analyze_trades(df):
     print(f"📈 Медианная сделка: {df['pnl_usdt'].median():.4f} USDT")
     print(f"📊 Win rate: {(len(profitable) / len(df) * 100):.1f}%")
     
-    # По символам
+    # По символам (агрегат уже посчитан в load_results)
     print("\n🏆 Топ-10 символов по прибыли:")
-    symbol_pnl = df.groupby('symbol').agg({
-        'pnl_usdt': ['sum', 'count', 'mean']
-    }).round(4)
-    symbol_pnl.columns = ['sum', 'count', 'mean']
-    symbol_pnl = symbol_pnl.sort_values('sum', ascending=False)
+    symbol_pnl = symbol_agg.copy()
+    symbol_pnl[['sum', 'mean']] = symbol_pnl[['sum', 'mean']].round(4)
+    top_symbols = symbol_pnl.nlargest(10, 'sum')
     
-    for symbol, row in symbol_pnl.head(10).iterrows():
-        win_rate_symbol = (df[df['symbol'] == symbol]['pnl_usdt'] > 0).mean() * 100
-        print(f"   {symbol}: {row['sum']:.2f} USDT ({int(row['count'])} сделок, WR: {win_rate_symbol:.1f}%, средняя {row['mean']:.4f})")
+    for symbol, pnl_sum, count, wr, mean in zip(top_symbols.index, top_symbols['sum'], top_symbols['count'],
+                                               top_symbols['wr'], top_symbols['mean']):
+        print(f"   {symbol}: {pnl_sum:.2f} USDT ({int(count)} сделок, WR: {wr * 100:.1f}%, средняя {mean:.4f})")
     
     # По причинам выхода
     if 'exit_reason' in df.columns:
         print("\n🚪 Причины выхода:")
-        exit_stats = df.groupby('exit_reason').agg({
+        exit_stats = df.groupby('exit_reason', observed=True).agg({
             'pnl_usdt': ['count', 'sum', 'mean']
         }).round(4)
         exit_stats.columns = ['count', 'sum', 'mean']
@@ -77,7 +93,9 @@ def analyze_trades(df):
     
     # Временной анализ
     print("\n⏱️  По часам (лучшее время для торговли):")
-    df['hour'] = df['entry_time'].dt.hour
+    # Час прямо из int64-буфера datetime64[ns], без поэлементного .dt.hour
+    entry_ns = df['entry_time'].values.view('i8')
+    df['hour'] = ((entry_ns // 3_600_000_000_000) % 24).astype(np.int8)
     hour_stats = df.groupby('hour').agg({
         'pnl_usdt': ['count', 'sum', 'mean']
     }).round(4)
@@ -94,21 +112,27 @@ def analyze_trades(df):
         'total_pnl': float(df['pnl_usdt'].sum()),
         'avg_pnl': float(df['pnl_usdt'].mean()),
         'win_rate': float(len(profitable) / len(df) * 100),
-        'best_symbol': str(symbol_pnl.index[0]) if not symbol_pnl.empty else None
+        'best_symbol': str(top_symbols.index[0]) if not top_symbols.empty else None
     }
 
-def plot_results(df, folder_path):
+MAX_PLOT_POINTS = 5000
+
+def plot_results(df, folder_path, symbol_agg):
     """Визуализация результатов"""
     try:
         fig, axes = plt.subplots(2, 2, figsize=(14, 10))
         
         # 1. Cumulative PnL
         df_sorted = df.sort_values('entry_time')
-        df_sorted['cumulative_pnl'] = df_sorted['pnl_usdt'].cumsum()
-        axes[0, 0].plot(df_sorted['entry_time'], df_sorted['cumulative_pnl'], 
-                        linewidth=2, color='green')
-        axes[0, 0].fill_between(df_sorted['entry_time'], 0, df_sorted['cumulative_pnl'], 
-                                alpha=0.3, color='green')
+        times = df_sorted['entry_time'].to_numpy()
+        cum_pnl = np.cumsum(df_sorted['pnl_usdt'].to_numpy())
+        if len(df_sorted) > MAX_PLOT_POINTS:
+            # Прореживаем кривую: последняя точка всегда попадает в выборку
+            points = np.linspace(0, len(df_sorted) - 1, MAX_PLOT_POINTS).astype(np.int64)
+            times = times[points]
+            cum_pnl = cum_pnl[points]
+        axes[0, 0].plot(times, cum_pnl, linewidth=2, color='green')
+        axes[0, 0].fill_between(times, 0, cum_pnl, alpha=0.3, color='green', rasterized=True)
         axes[0, 0].set_title('Cumulative PnL Over Time')
         axes[0, 0].set_xlabel('Date')
         axes[0, 0].set_ylabel('Cumulative PnL (USDT)')
@@ -116,7 +140,9 @@ def plot_results(df, folder_path):
         axes[0, 0].axhline(y=0, color='black', linestyle='-', alpha=0.3)
         
         # 2. PnL Distribution
-        axes[0, 1].hist(df['pnl_usdt'], bins=30, edgecolor='black', alpha=0.7)
+        # Бины считаем в numpy и рисуем одним контуром вместо 30 прямоугольников
+        counts, edges = np.histogram(df['pnl_usdt'].to_numpy(), bins=30)
+        axes[0, 1].stairs(counts, edges, fill=True, edgecolor='black', alpha=0.7)
         axes[0, 1].axvline(x=0, color='red', linestyle='--', alpha=0.5, linewidth=2)
         axes[0, 1].axvline(x=df['pnl_usdt'].mean(), color='green', linestyle='--', alpha=0.5, linewidth=2, 
                           label=f'Mean: {df["pnl_usdt"].mean():.2f}')
@@ -126,7 +152,7 @@ def plot_results(df, folder_path):
         axes[0, 1].legend()
         
         # 3. Top Symbols by PnL
-        symbol_pnl = df.groupby('symbol')['pnl_usdt'].sum().sort_values(ascending=False).head(15)
+        symbol_pnl = symbol_agg['sum'].sort_values(ascending=False).head(15)
         if not symbol_pnl.empty:
             colors = ['green' if x > 0 else 'red' for x in symbol_pnl.values]
             axes[1, 0].barh(range(len(symbol_pnl)), symbol_pnl.values, color=colors[::-1], alpha=0.7)
@@ -138,9 +164,7 @@ def plot_results(df, folder_path):
         
         # 4. Win Rate by Hour
         if 'hour' in df.columns:
-            hour_winrate = df.groupby('hour').apply(
-                lambda x: (x['pnl_usdt'] > 0).sum() / len(x) * 100
-            )
+            hour_winrate = df.assign(_win=(df['pnl_usdt'] > 0)).groupby('hour')['_win'].mean().mul(100)
             axes[1, 1].plot(hour_winrate.index, hour_winrate.values, marker='o', linewidth=2)
             axes[1, 1].set_title('Win Rate by Hour')
             axes[1, 1].set_xlabel('Hour')
@@ -169,12 +193,12 @@ def main():
     print(f"\n📂 Анализируем папку: {args.folder}")
     
     # Загружаем данные
-    df = load_results(args.folder)
+    df, symbol_agg = load_results(args.folder)
     if df is None:
         return
     
     # Анализируем
-    stats = analyze_trades(df)
+    stats = analyze_trades(df, symbol_agg)
     
     # Сохраняем статистику в ту же папку
     try:
@@ -186,7 +210,7 @@ def main():
         print(f"\n⚠️ Не удалось сохранить JSON: {e}")
     
     # Строим графики
-    plot_results(df, args.folder)
+    plot_results(df, args.folder, symbol_agg)
     
     print("\n" + "=" * 60)
     print("✅ Анализ завершен")
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.compare_results import top_k
+
+
+@pytest.mark.parametrize("values", [
+    [1.0, 5.0, 3.0, 2.0, 0.5],
+    [1.0, 3.0, 3.0, 2.0, 3.0],
+    [1.0, np.nan, 3.0, 2.0, 0.5],
+    [np.nan, np.inf, 1.0, np.nan, -np.inf],
+    [np.nan, 2.0, np.nan, np.nan, 1.0],
+    [np.nan, 2.0, np.nan],
+    [np.nan, np.nan],
+    [],
+])
+@pytest.mark.parametrize("largest", [True, False])
+def test_top_k_matches_nlargest_nsmallest(values, largest):
+    df = pd.DataFrame({"sharpe": values, "test": [f"t{i}" for i in range(len(values))]})
+    expected = df.nlargest(3, "sharpe") if largest else df.nsmallest(3, "sharpe")
+    pd.testing.assert_frame_equal(top_k(df, "sharpe", k=3, largest=largest), expected)
+
+
+def test_top_k_skips_nan():
+    df = pd.DataFrame({"sharpe": [1.0, np.nan, 3.0, 2.0, 0.5]})
+    assert top_k(df, "sharpe", k=3)["sharpe"].tolist() == [3.0, 2.0, 1.0]
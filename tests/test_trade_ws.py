@@ -0,0 +1,75 @@
+import json
+import threading
+
+import pytest
+
+from live.trade_ws import BybitTradeWS, _TradingSocket
+
+
+class _FakeConnection:
+    """Вместо websocket-соединения: запоминает отправленные сообщения, ответ шлет reply_with"""
+
+    def __init__(self):
+        self.sent = []
+        self.reply_with = None
+
+    def send(self, raw):
+        self.sent.append(json.loads(raw))
+        if self.reply_with is not None:
+            threading.Thread(target=self.reply_with, args=(self.sent[-1],)).start()
+
+
+def _make_trade_ws(timeout: float = 0.05) -> BybitTradeWS:
+    socket = object.__new__(_TradingSocket)
+    socket.callback_directory = {}
+    socket.recv_window = 0
+    socket.referral_id = ""
+    socket.ws = _FakeConnection()
+    trade_ws = object.__new__(BybitTradeWS)
+    trade_ws.timeout = timeout
+    trade_ws._ws = socket
+    return trade_ws
+
+
+def test_late_reply_after_timeout_keeps_socket_usable():
+    trade_ws = _make_trade_ws()
+    socket = trade_ws._ws
+
+    with pytest.raises(TimeoutError):
+        trade_ws.place_order(category="linear", symbol="BTCUSDT", side="Sell")
+    late_id = socket.ws.sent[-1]["reqId"]
+    assert late_id not in socket.callback_directory
+
+    # Поздний ACK на снятый запрос: pybit без поправки падает тут с KeyError
+    socket._handle_incoming_message({"reqId": late_id, "retCode": 0, "retMsg": "OK", "op": "order.create", "data": {}})
+
+    socket.ws.reply_with = lambda request: socket._handle_incoming_message({
+        "reqId": request["reqId"], "retCode": 0, "retMsg": "OK", "op": "order.create",
+        "data": {"orderId": "1", "orderLinkId": request["args"][0].get("orderLinkId")},
+    })
+    result = trade_ws.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderLinkId="abc")
+    assert result["retCode"] == 0
+    assert result["result"]["orderLinkId"] == "abc"
+    assert socket.callback_directory == {}
+
+
+def test_late_error_reply_after_timeout_is_dropped():
+    trade_ws = _make_trade_ws()
+    socket = trade_ws._ws
+
+    with pytest.raises(TimeoutError):
+        trade_ws.place_order(category="linear", symbol="BTCUSDT", side="Sell")
+    late_id = socket.ws.sent[-1]["reqId"]
+
+    socket._handle_incoming_message({"reqId": late_id, "retCode": 10001, "retMsg": "error", "op": "order.create"})
+    assert socket.callback_directory == {}
+
+
+def test_referer_header_is_sent():
+    trade_ws = _make_trade_ws()
+    socket = trade_ws._ws
+    socket.referral_id = "ref"
+
+    with pytest.raises(TimeoutError):
+        trade_ws.place_order(category="linear", symbol="BTCUSDT", side="Sell")
+    assert socket.ws.sent[-1]["header"]["Referer"] == "ref"